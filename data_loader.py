@@ -0,0 +1,214 @@
+"""
+Shared loading of the company_info tables for the marimo notebooks.
+
+Tables are cached in memory, keyed by location plus ETag (remote) or modification
+time and size (local), and remote downloads are streamed into an on-disk cache that
+is revalidated with If-None-Match on the next load. The typed parquet copy written
+by etl.py is preferred over the csv when it exists, and csv tables get the same
+dtypes applied while they are parsed.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pandas as pd
+
+CACHE_DIR = os.environ.get(
+    "FINNISH_STARTUPS_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "finnish_startups_data"),
+)
+
+FINANCIAL_DTYPES = {
+    column: "float64"
+    for column in (
+        "turnover",
+        "turnover_change_pct",
+        "operating_profit",
+        "operating_margin_pct",
+        "solvency_ratio",
+        "balance_sheet_total",
+        "num_employees",
+        "ebitda_margin_pct",
+        "roi_pct",
+        "equity_total",
+        "net_income",
+        "quick_ratio",
+        "current_ratio",
+    )
+}
+
+TABLE_DTYPES = {
+    "basic_details": {
+        "business_id": "Int64",
+        "postal_code": "string",
+        "postal_address_code": "string",
+        "main_line_of_business_code": "string",
+        "province": "category",
+        "city": "category",
+        "company_form": "category",
+        "main_line_of_business": "category",
+        "main_line_of_business_category": "category",
+        "lat": "float64",
+        "lon": "float64",
+    },
+    "financial_details": {"business_id": "Int64", "year": "Int16", **FINANCIAL_DTYPES},
+    "main_decision_makers": {"business_id": "Int64", "decision_person_id": "Int64"},
+    "all_decision_makers": {
+        "business_id": "Int64",
+        "decision_person_id": "Int64",
+        "company_turnover": "float64",
+        "company_operating_margin": "float64",
+    },
+    "director_companies": {
+        "company": "string",
+        "business_id": "Int64",
+        "name": "string",
+        "people": "int64",
+        "degree": "int64",
+        "strength": "int64",
+        "component": "int64",
+        "component_size": "int64",
+        "pagerank": "float64",
+    },
+    "director_interlocks": {
+        "source": "string",
+        "target": "string",
+        "shared_people": "int64",
+    },
+    "map_clusters": {"business_id": "Int64", "name": "string"},
+    "company_locations": {
+        "business_id": "Int64",
+        "name": "string",
+        "lat": "float64",
+        "lon": "float64",
+        "cell": "int64",
+    },
+    "location_index": {"cell": "int64", "start": "int64", "stop": "int64"},
+    "summary_company_counts": {
+        "main_line_of_business_category": "category",
+        "city": "category",
+        "companies": "int64",
+    },
+    "summary_financials": {
+        "grouping": "category",
+        "year": "Int16",
+        "main_line_of_business_category": "category",
+        "city": "category",
+        "metric": "category",
+        "count": "int64",
+        **{column: "float64" for column in ("sum", "p10", "p25", "p50", "p75", "p90")},
+    },
+}
+
+_MEMORY_CACHE = {}
+
+
+def is_remote(path: str) -> bool:
+    return str(path).startswith(("http://", "https://"))
+
+
+def table_name(path: str) -> str:
+    return os.path.splitext(os.path.basename(str(path).split("?", 1)[0]))[0]
+
+
+def fetch(url: str, cache_dir: str = CACHE_DIR) -> tuple:
+    """
+    Streams url into the on-disk cache. A cached copy is revalidated with its ETag
+    and reused when the server answers 304 Not Modified.
+
+    Returns:
+        tuple: (local file path, version) where version is the ETag of the response
+            or the sha256 of its content.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    data_path = os.path.join(cache_dir, key)
+    meta_path = f"{data_path}.json"
+
+    meta = {}
+    if os.path.exists(meta_path) and os.path.exists(data_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+    headers = {"If-None-Match": meta["etag"]} if meta.get("etag") else {}
+    try:
+        with urlopen(Request(url, headers=headers)) as response:
+            digest = hashlib.sha256()
+            tmp_path = f"{data_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                for block in iter(lambda: response.read(1 << 16), b""):
+                    digest.update(block)
+                    f.write(block)
+            os.replace(tmp_path, data_path)
+            meta = {"etag": response.headers.get("ETag"), "sha256": digest.hexdigest()}
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+    except HTTPError as e:
+        if e.code != 304 or not meta:
+            raise
+    return data_path, meta.get("etag") or meta["sha256"]
+
+
+def resolve(path: str) -> tuple:
+    """
+    Returns:
+        tuple: (local file path, version) of a local path or url.
+    """
+    if is_remote(path):
+        return fetch(path)
+    stat = os.stat(path)
+    return path, f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def read_csv(local_path: str, name: str) -> pd.DataFrame:
+    dtypes = TABLE_DTYPES.get(name, {})
+    header = pd.read_csv(local_path, nrows=0).columns
+    return pd.read_csv(
+        local_path,
+        dtype={column: dtype for column, dtype in dtypes.items() if column in header},
+    )
+
+
+def load_data(path) -> pd.DataFrame:
+    """
+    Loads a company_info table from a local path or url, preferring the parquet
+    copy next to a local csv. Returns a copy of the cached frame, so callers can
+    modify it freely.
+    """
+    path = str(path)
+    name = table_name(path)
+    candidates = []
+    # only the csv tables are committed and published with the site, a parquet
+    # url would be a failed request on every load
+    if path.endswith(".csv") and not is_remote(path):
+        candidates.append((path[: -len(".csv")] + ".parquet", "parquet"))
+    candidates.append((path, "csv"))
+
+    for candidate, file_format in candidates:
+        try:
+            local_path, version = resolve(candidate)
+        except OSError:
+            if file_format == "csv":
+                raise
+            continue
+
+        key = (candidate, version)
+        if key not in _MEMORY_CACHE:
+            try:
+                if file_format == "parquet":
+                    _MEMORY_CACHE[key] = pd.read_parquet(local_path)
+                else:
+                    _MEMORY_CACHE[key] = read_csv(local_path, name)
+            except (ImportError, ValueError, OSError):
+                if file_format == "csv":
+                    raise
+                continue
+        return _MEMORY_CACHE[key].copy()
+
+
+def clear_cache() -> None:
+    _MEMORY_CACHE.clear()
@@ -0,0 +1,477 @@
+"""
+Sparse-matrix construction and cached layout of the decision maker networks drawn
+in the decision makers notebook.
+
+People and companies form a bipartite graph with incidence matrix B (people x
+companies). The co-board graph of people sitting in the same company is B @ B.T,
+whose off-diagonal entries are the number of companies two people share, and the
+interlock graph of companies sharing a decision maker is B.T @ B.
+"""
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+import networkx as nx
+from scipy import sparse
+from scipy.sparse import csgraph
+
+
+def incidence_matrix(
+    df: pd.DataFrame,
+    row_column: str = "decision_person_id",
+    column_column: str = "business_id",
+) -> tuple:
+    """
+    Builds the binary incidence matrix of a two-column relation, duplicate pairs
+    counted once.
+
+    Returns:
+        tuple: (csr matrix, row ids, column ids). Row i of the matrix is row_ids[i].
+    """
+    pairs = df[[row_column, column_column]].dropna().drop_duplicates()
+    row_codes, row_ids = pd.factorize(pairs[row_column], sort=True)
+    column_codes, column_ids = pd.factorize(pairs[column_column], sort=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.int64), (row_codes, column_codes)),
+        shape=(len(row_ids), len(column_ids)),
+    )
+    return matrix, np.asarray(row_ids), np.asarray(column_ids)
+
+
+def coboard_matrix(df: pd.DataFrame) -> tuple:
+    """
+    Person-person adjacency weighted by the number of shared companies, with an
+    empty diagonal.
+
+    Returns:
+        tuple: (symmetric csr matrix, person ids).
+    """
+    incidence, person_ids, _ = incidence_matrix(df)
+    adjacency = (incidence @ incidence.T).tocsr()
+    adjacency.setdiag(0)
+    adjacency.eliminate_zeros()
+    return adjacency, person_ids
+
+
+def person_labels(df: pd.DataFrame) -> pd.Series:
+    """
+    "first_name last_name" of every person, indexed by decision_person_id.
+    """
+    people = df.dropna(subset=["decision_person_id"]).drop_duplicates(
+        "decision_person_id"
+    )
+    labels = people["first_name"].fillna("") + " " + people["last_name"].fillna("")
+    return pd.Series(labels.to_numpy(), index=people["decision_person_id"].to_numpy())
+
+
+def to_networkx(adjacency, node_ids, labels: pd.Series = None) -> nx.Graph:
+    """
+    Converts a symmetric weighted adjacency to a networkx graph in bulk. Every node
+    is added, also the ones filter_adjacency left without edges, labelled from
+    labels or their id.
+    """
+    upper = sparse.triu(adjacency, k=1).tocoo()
+    node_ids = np.asarray(node_ids)
+    G = nx.Graph()
+    G.add_nodes_from(node_ids.tolist())
+    G.add_weighted_edges_from(
+        zip(
+            node_ids[upper.row].tolist(),
+            node_ids[upper.col].tolist(),
+            upper.data.tolist(),
+        )
+    )
+
+    nodes = list(G.nodes)
+    if labels is None:
+        node_labels = [str(node) for node in nodes]
+    else:
+        node_labels = labels.reindex(nodes)
+        node_labels = node_labels.where(
+            node_labels.notna(), pd.Series(nodes, index=node_labels.index).astype(str)
+        ).tolist()
+    nx.set_node_attributes(G, dict(zip(nodes, node_labels)), "label")
+    return G
+
+
+def filter_adjacency(
+    adjacency, node_ids, min_weight: int = 1, min_degree: int = 1
+) -> tuple:
+    """
+    Drops the edges lighter than min_weight, then the nodes with fewer than
+    min_degree remaining edges. Nodes without any edge to begin with are not part
+    of the graph and always dropped. Works on the sparse matrix, so a threshold
+    change costs a few vectorized passes over the edges instead of a graph copy.
+
+    Returns:
+        tuple: (csr adjacency of the kept nodes, their ids)
+    """
+    adjacency = sparse.csr_matrix(adjacency)
+    in_graph = np.diff(adjacency.indptr) > 0
+
+    filtered = adjacency.copy()
+    filtered.data[filtered.data < min_weight] = 0
+    filtered.eliminate_zeros()
+    keep = np.flatnonzero(in_graph & (np.diff(filtered.indptr) >= min_degree))
+    return filtered[keep][:, keep], np.asarray(node_ids)[keep]
+
+
+def component_sizes(adjacency) -> np.ndarray:
+    """
+    Sizes of the connected components of an undirected adjacency matrix.
+    """
+    if adjacency.shape[0] == 0:
+        return np.empty(0, dtype=np.int64)
+    _, labels = csgraph.connected_components(adjacency, directed=False)
+    return np.bincount(labels)
+
+
+def component_size_histogram(adjacency, min_size: int = 1) -> tuple:
+    """
+    Returns:
+        tuple: (component sizes, number of components of each size), sizes below
+            min_size left out.
+    """
+    sizes = component_sizes(adjacency)
+    return np.unique(sizes[sizes >= min_size], return_counts=True)
+
+
+def build_coboard_graph(df: pd.DataFrame) -> nx.Graph:
+    """
+    Person-person graph of a decision makers table: an edge joins two people
+    sitting in the same company, weighted by the number of shared companies.
+    """
+    df = df.dropna(subset=["decision_person_id", "business_id"])
+    # people without a co-board member are not part of the graph
+    adjacency, person_ids = filter_adjacency(*coboard_matrix(df))
+    return to_networkx(adjacency, person_ids, person_labels(df))
+
+
+def normalize_name(name):
+    return name.strip().lower() if isinstance(name, str) else None
+
+
+def company_memberships(
+    all_decision_makers_df: pd.DataFrame,
+    main_decision_makers_df: pd.DataFrame = None,
+    basic_details_df: pd.DataFrame = None,
+) -> pd.DataFrame:
+    """
+    Person-company pairs of the director network. A row of all_decision_makers
+    links a decision maker of the scraped company business_id to another company
+    they hold a position in, known only by its name (full_name). Names matching a
+    scraped company in basic_details are resolved to its business id.
+
+    Returns:
+        pd.DataFrame: decision_person_id, company, business_id and name columns.
+            company is the business id of scraped companies and the normalized
+            name of the others.
+    """
+    name_ids = pd.Series(dtype="Int64")
+    scraped_names = pd.Series(dtype=object)
+    if basic_details_df is not None and len(basic_details_df):
+        scraped = basic_details_df.dropna(subset=["business_id"]).drop_duplicates(
+            "business_id"
+        )
+        scraped_ids = pd.to_numeric(scraped["business_id"], errors="coerce").astype(
+            "Int64"
+        )
+        scraped_names = pd.Series(scraped["name"].to_numpy(), index=scraped_ids)
+        name_ids = pd.Series(
+            scraped_ids.to_numpy(), index=scraped["name"].map(normalize_name)
+        )
+        name_ids = name_ids[name_ids.index.notna() & ~name_ids.index.duplicated()]
+
+    all_decision_makers_df = all_decision_makers_df.reindex(
+        columns=["decision_person_id", "business_id", "full_name"]
+    )
+    frames = [
+        all_decision_makers_df[["decision_person_id", "business_id"]],
+        all_decision_makers_df[["decision_person_id", "full_name"]].rename(
+            columns={"full_name": "name"}
+        ),
+    ]
+    if main_decision_makers_df is not None:
+        frames.append(
+            main_decision_makers_df.reindex(
+                columns=["decision_person_id", "business_id"]
+            )
+        )
+    pairs = pd.concat(frames, ignore_index=True)
+    pairs = pairs.dropna(subset=["decision_person_id"])
+    pairs = pairs.dropna(subset=["business_id", "name"], how="all")
+
+    business_ids = pd.to_numeric(pairs["business_id"], errors="coerce").astype("Int64")
+    pairs["business_id"] = business_ids.fillna(
+        pairs["name"].map(normalize_name).map(name_ids).astype("Int64")
+    )
+    pairs["name"] = (
+        pairs["name"].fillna(pairs["business_id"].map(scraped_names)).str.strip()
+    )
+    # case and whitespace variants of a name are the same company, the first
+    # spelling is kept as its display name
+    pairs["company"] = (
+        pairs["business_id"]
+        .astype("string")
+        .fillna(pairs["name"].map(normalize_name).astype("string"))
+    )
+    return pairs.drop_duplicates(["decision_person_id", "company"])[
+        ["decision_person_id", "company", "business_id", "name"]
+    ].reset_index(drop=True)
+
+
+def pagerank(
+    adjacency, damping: float = 0.85, tol: float = 1e-10, max_iter: int = 200
+) -> np.ndarray:
+    """
+    PageRank of a weighted undirected adjacency by sparse power iteration. The rank
+    of nodes without edges is spread evenly over all nodes.
+    """
+    n = adjacency.shape[0]
+    if n == 0:
+        return np.empty(0)
+    strength = np.asarray(adjacency.sum(axis=1), dtype=float).ravel()
+    inverse = np.divide(1.0, strength, out=np.zeros(n), where=strength > 0)
+    transition_t = (sparse.diags(inverse) @ adjacency).T.tocsr()
+    dangling = strength == 0
+
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        updated = (
+            damping * (transition_t @ rank + rank[dangling].sum() / n)
+            + (1 - damping) / n
+        )
+        converged = np.abs(updated - rank).sum() < n * tol
+        rank = updated
+        if converged:
+            break
+    return rank
+
+
+def company_network(memberships: pd.DataFrame) -> tuple:
+    """
+    Projects the person-company memberships to the company interlock graph and
+    computes its node statistics with sparse matrix operations only.
+
+    Returns:
+        tuple: (companies, interlocks). companies has one row per company with
+            people (number of its decision makers in the data), degree (number
+            of interlocked companies), strength (shared decision makers summed over
+            them), component, component_size and pagerank. interlocks holds every
+            pair of companies sharing shared_people decision makers.
+    """
+    incidence, _, companies = incidence_matrix(
+        memberships, row_column="decision_person_id", column_column="company"
+    )
+    adjacency = (incidence.T @ incidence).tocsr()
+    people = adjacency.diagonal()
+    adjacency.setdiag(0)
+    adjacency.eliminate_zeros()
+
+    if len(companies):
+        _, component = csgraph.connected_components(adjacency, directed=False)
+    else:
+        component = np.empty(0, dtype=np.int64)
+    # components numbered by size, 0 is the largest
+    sizes = np.bincount(component)
+    order = np.argsort(-sizes, kind="stable")
+    component = np.argsort(order)[component] if len(sizes) else component
+
+    details = memberships.drop_duplicates("company").set_index("company")
+    companies_df = pd.DataFrame(
+        {
+            "company": companies,
+            "business_id": details["business_id"].reindex(companies).array,
+            "name": details["name"].reindex(companies).to_numpy(),
+            "people": people,
+            "degree": np.diff(adjacency.indptr).astype(np.int64),
+            "strength": np.asarray(adjacency.sum(axis=1)).ravel().astype(np.int64),
+            "component": component,
+            "component_size": sizes[order][component] if len(sizes) else component,
+            "pagerank": pagerank(adjacency),
+        }
+    )
+
+    # companies only known by name are left out unless they are interlocked
+    companies_df = companies_df[
+        companies_df["business_id"].notna() | (companies_df["degree"] > 0)
+    ].reset_index(drop=True)
+
+    upper = sparse.triu(adjacency, k=1).tocoo()
+    interlocks_df = pd.DataFrame(
+        {
+            "source": companies[upper.row],
+            "target": companies[upper.col],
+            "shared_people": upper.data,
+        }
+    )
+    return companies_df, interlocks_df
+
+
+LAYOUT_METHODS = ("auto", "spring", "force")
+# "auto" uses the grid approximated force layout above this many nodes
+LARGE_GRAPH_NODES = 1000
+LAYOUT_ITERATIONS = 50
+WARM_START_ITERATIONS = 15
+
+_LAYOUT_CACHE = {}
+_LAST_POSITIONS = {}
+
+
+def graph_fingerprint(G: nx.Graph) -> str:
+    """
+    sha256 of the nodes and weighted edges of a graph, independent of their order.
+    """
+    nodes = sorted(map(repr, G.nodes))
+    edges = sorted(
+        "|".join(sorted((repr(u), repr(v)))) + f"|{w!r}"
+        for u, v, w in G.edges(data="weight", default=1)
+    )
+    return hashlib.sha256("\n".join(nodes + edges).encode("utf-8")).hexdigest()
+
+
+def force_directed_positions(
+    adjacency,
+    init: np.ndarray = None,
+    iterations: int = LAYOUT_ITERATIONS,
+    temperature: float = 0.1,
+    seed: int = 42,
+    grid: int = 16,
+) -> np.ndarray:
+    """
+    Fruchterman-Reingold layout with the repulsion approximated on a mesh: every node
+    is pushed away from the centroids of the occupied cells of a grid x grid mesh,
+    weighted by their node count, instead of from every other node. An iteration
+    costs O(n * grid^2 + edges) instead of O(n^2).
+
+    Args:
+        adjacency: Symmetric sparse weighted adjacency matrix.
+        init (np.ndarray, optional): (n, 2) start positions, random if not set.
+        iterations (int): Number of iterations.
+        temperature (float): Largest step of a node in the first iteration, it
+            cools down linearly to 0.
+        seed (int): Seed of the random start positions.
+        grid (int): Mesh resolution of the repulsion.
+
+    Returns:
+        np.ndarray: (n, 2) positions, in the row order of adjacency.
+    """
+    n = adjacency.shape[0]
+    rng = np.random.default_rng(seed)
+    pos = rng.random((n, 2)) if init is None else np.array(init, dtype=float)
+    if n < 2:
+        return pos
+
+    edges = sparse.coo_matrix(adjacency)
+    k2 = 1.0 / n
+    k = np.sqrt(k2)
+    step = temperature / (iterations + 1)
+    for _ in range(iterations):
+        low = pos.min(axis=0)
+        span = np.maximum(np.ptp(pos, axis=0), 1e-9)
+        cell = np.minimum(((pos - low) / span * grid).astype(np.intp), grid - 1)
+        cell_id = cell[:, 0] * grid + cell[:, 1]
+        mass = np.bincount(cell_id, minlength=grid * grid)
+        occupied = np.flatnonzero(mass)
+        cell_mass = mass[occupied]
+        cell_x = np.bincount(cell_id, pos[:, 0], grid * grid)[occupied] / cell_mass
+        cell_y = np.bincount(cell_id, pos[:, 1], grid * grid)[occupied] / cell_mass
+
+        dx = pos[:, 0, None] - cell_x
+        dy = pos[:, 1, None] - cell_y
+        repulsion = cell_mass * k2 / np.maximum(dx * dx + dy * dy, k2 * 0.01)
+        displacement = np.stack([(dx * repulsion).sum(1), (dy * repulsion).sum(1)], 1)
+
+        delta = pos[edges.row] - pos[edges.col]
+        attraction = delta * (edges.data * np.linalg.norm(delta, axis=1) / k)[:, None]
+        displacement[:, 0] -= np.bincount(edges.row, attraction[:, 0], n)
+        displacement[:, 1] -= np.bincount(edges.row, attraction[:, 1], n)
+
+        length = np.maximum(np.linalg.norm(displacement, axis=1), 1e-9)
+        pos += displacement * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= step
+    return pos
+
+
+def layout_positions(G: nx.Graph, method: str = "auto", seed: int = 42) -> dict:
+    """
+    Layout of G, cached by graph fingerprint. Nodes laid out before start from their
+    previous positions, and if all of them were, only WARM_START_ITERATIONS
+    iterations are run. This is the case when a filter threshold changes and the
+    graph loses some edges or nodes.
+
+    Args:
+        G (nx.Graph): Graph to lay out.
+        method (str): "spring" for networkx's spring layout, "force" for
+            force_directed_positions, "auto" picks "force" for graphs larger than
+            LARGE_GRAPH_NODES.
+        seed (int): Seed of the random start positions.
+
+    Returns:
+        dict: {node: np.array([x, y])} scaled to [-1, 1].
+    """
+    if method not in LAYOUT_METHODS:
+        raise ValueError(f"Unknown layout method: {method}")
+    if method == "auto":
+        method = "spring" if len(G) <= LARGE_GRAPH_NODES else "force"
+
+    key = (method, graph_fingerprint(G), seed)
+    if key not in _LAYOUT_CACHE:
+        nodes = list(G.nodes)
+        known = {
+            node: _LAST_POSITIONS[node] for node in nodes if node in _LAST_POSITIONS
+        }
+        warm = bool(nodes) and len(known) == len(nodes)
+        iterations = WARM_START_ITERATIONS if warm else LAYOUT_ITERATIONS
+
+        if method == "spring":
+            positions = nx.spring_layout(
+                G, pos=known or None, seed=seed, iterations=iterations
+            )
+        else:
+            init = None
+            if known:
+                init = np.random.default_rng(seed).uniform(-1, 1, (len(nodes), 2))
+                for i, node in enumerate(nodes):
+                    if node in known:
+                        init[i] = known[node]
+            xy = force_directed_positions(
+                nx.to_scipy_sparse_array(G, nodelist=nodes),
+                init,
+                iterations=iterations,
+                temperature=0.02 if warm else 0.1,
+                seed=seed,
+            )
+            xy = nx.rescale_layout(xy) if len(nodes) > 1 else np.zeros_like(xy)
+            positions = dict(zip(nodes, xy))
+
+        _LAYOUT_CACHE[key] = positions
+        _LAST_POSITIONS.update(positions)
+    return _LAYOUT_CACHE[key]
+
+
+def clear_layout_cache() -> None:
+    _LAYOUT_CACHE.clear()
+    _LAST_POSITIONS.clear()
+
+
+def plot_coordinates(G: nx.Graph, positions: dict) -> tuple:
+    """
+    Returns:
+        tuple: (nodes, node_xy, edge_x, edge_y). node_xy is an (n, 2) array in the
+            order of nodes, edge_x and edge_y hold the edge segments separated by
+            NaN, as plotly line traces expect.
+    """
+    nodes = list(G.nodes)
+    if not nodes:
+        return nodes, np.empty((0, 2)), np.empty(0), np.empty(0)
+    node_xy = np.array([positions[node] for node in nodes], dtype=float)
+
+    edges = sparse.triu(
+        nx.to_scipy_sparse_array(G, nodelist=nodes, weight=None), k=1
+    ).tocoo()
+    segments = np.full((len(edges.row), 3, 2), np.nan)
+    segments[:, 0] = node_xy[edges.row]
+    segments[:, 1] = node_xy[edges.col]
+    return nodes, node_xy, segments[:, :, 0].ravel(), segments[:, :, 1].ravel()
@@ -3,42 +3,111 @@ This script extracts and transforms company data from scraped JSON files into cs
 """
 
 import os
+import re
+import mmap
 import yaml
 import json
+import pickle
+import hashlib
+import argparse
+from collections import Counter
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 
 import pandas as pd
 
-
-def clean_year(value):
-    year_str = str(value)
-    return year_str[:4] if len(year_str) > 4 else year_str
+import map_clusters
+import director_network
+from raw_store import RawPageStore, iter_records
 
 
+@lru_cache(maxsize=None)
 def load_yml(path: str = "data/translations.yml") -> dict:
     with open(path, "r", encoding="utf-8") as file:
         return yaml.safe_load(file)
 
 
-def extract_basic_company_details(data, json_file_name, business_id):
+class Translations:
+    """
+    Finnish -> English lookup tables for business categories, built once per run.
+    Unknown names are collected instead of raising, and every lookup is counted.
+    """
+
+    SECTIONS = ("category_translations", "sub_category_translations")
+
+    def __init__(self, translation_dict: dict):
+        self.mappings = {
+            section: dict(translation_dict.get(section) or {})
+            for section in self.SECTIONS
+        }
+        self.lookups = 0
+        self.misses = 0
+        self.unknown = {section: Counter() for section in self.SECTIONS}
+
+    @classmethod
+    def from_yml(cls, path: str = "data/translations.yml") -> "Translations":
+        return cls(load_yml(path))
+
+    def translate(self, section: str, name: str):
+        if not name:
+            return None
+        self.lookups += 1
+        translation = self.mappings[section].get(name)
+        if translation is None:
+            self.misses += 1
+            self.unknown[section][name] += 1
+        return translation
+
+    def stats(self) -> dict:
+        return {
+            "lookups": self.lookups,
+            "misses": self.misses,
+            "unknown": {
+                section: dict(names) for section, names in self.unknown.items()
+            },
+        }
+
+
+def merge_translation_stats(target: dict, partial: dict) -> dict:
+    target["lookups"] = target.get("lookups", 0) + partial["lookups"]
+    target["misses"] = target.get("misses", 0) + partial["misses"]
+    unknown = target.setdefault("unknown", {})
+    for section, names in partial["unknown"].items():
+        section_names = unknown.setdefault(section, {})
+        for name, count in names.items():
+            section_names[name] = section_names.get(name, 0) + count
+    return target
+
+
+def coordinate_values(coordinates) -> dict:
+    """
+    Float lat and lon of the raw {"lat": ..., "lon": ...} coordinates. Missing,
+    non numeric and out of range coordinates become None.
+    """
+    try:
+        lat = float(coordinates["lat"])
+        lon = float(coordinates["lon"])
+    except (KeyError, TypeError, ValueError):
+        return {"lat": None, "lon": None}
+    if not map_clusters.valid_coordinates(lat, lon):
+        return {"lat": None, "lon": None}
+    return {"lat": lat, "lon": lon}
+
+
+def extract_basic_company_details(
+    data, json_file_name, business_id, translations: Translations = None
+):
     address_data = data.get("address", {})
 
     # translation
-    translation_dict = load_yml()
-    category_mappings = translation_dict.get("category_translations", {})
-    if data.get("mainLineOfBusinessName"):
-        main_line_of_business_category = category_mappings[
-            data.get("mainLineOfBusinessName")
-        ]
-    else:
-        main_line_of_business_category = None
-
-    sub_category_mappings = translation_dict.get("sub_category_translations", {})
-    if data.get("tolMainLineofBusinessName"):
-        main_line_of_business_subcategory = sub_category_mappings[
-            data.get("tolMainLineofBusinessName")
-        ]
-    else:
-        main_line_of_business_subcategory = None
+    if translations is None:
+        translations = Translations.from_yml()
+    main_line_of_business_category = translations.translate(
+        "category_translations", data.get("mainLineOfBusinessName")
+    )
+    main_line_of_business_subcategory = translations.translate(
+        "sub_category_translations", data.get("tolMainLineofBusinessName")
+    )
 
     basic_company_details = {
         "business_id": business_id,
@@ -50,9 +119,7 @@ def extract_basic_company_details(data, json_file_name, business_id):
         "street_address": address_data.get("streetAddress"),
         "postal_code": address_data.get("postalCode"),
         "post_office": address_data.get("postOffice"),
-        "coordinates": tuple(data.get("coordinates").values())
-        if data.get("coordinates")
-        else None,
+        **coordinate_values(data.get("coordinates")),
         "postal_address": data.get("postalAddressBox"),
         "postal_address_code": data.get("postalAddressPostalCode"),
         "postal_address_post_offoce": data.get("postalAddressPostOffice"),
@@ -68,57 +135,57 @@ def extract_basic_company_details(data, json_file_name, business_id):
     return basic_company_details
 
 
-def extract_company_financial_details(data, business_id):
-    financial_fields = {
-        "turnover": "financialTurnovers",
-        "turnover_change_pct": "financialTurnoverPercentageChanges",
-        "operating_profit": "financialOperatingProfits",
-        "operating_margin_pct": "financialOperatingMargins",
-        "solvency_ratio": "financialSolvencies",
-        "balance_sheet_total": "financialBalances",
-        "num_employees": "financialNumberOfEmployees",
-        "ebitda_margin_pct": "financialEBITDAs",
-        "roi_pct": "financialROIs",
-        "equity_total": "financialEquities",
-        "net_income": "financialNetIncomes",
-        "quick_ratio": "financialQuickRatios",
-        "current_ratio": "financialCurrentRatios",
-    }
+FINANCIAL_FIELDS = {
+    "turnover": "financialTurnovers",
+    "turnover_change_pct": "financialTurnoverPercentageChanges",
+    "operating_profit": "financialOperatingProfits",
+    "operating_margin_pct": "financialOperatingMargins",
+    "solvency_ratio": "financialSolvencies",
+    "balance_sheet_total": "financialBalances",
+    "num_employees": "financialNumberOfEmployees",
+    "ebitda_margin_pct": "financialEBITDAs",
+    "roi_pct": "financialROIs",
+    "equity_total": "financialEquities",
+    "net_income": "financialNetIncomes",
+    "quick_ratio": "financialQuickRatios",
+    "current_ratio": "financialCurrentRatios",
+}
 
+# reported in thousands of euros
+FINANCIAL_THOUSANDS_COLUMNS = ("turnover", "operating_profit", "net_income")
+
+
+def extract_company_financial_details(data, business_id) -> dict:
+    """
+    Returns the raw fiscal year arrays of a company as a columnar block,
+    {column: [values]}, padded to the number of fiscal years. Parsing and
+    scaling happen for all companies at once in normalize_financial_details.
+    """
     years = data.get("financialFiscalYears", [])
-    financial_arrays = {
-        field: data.get(json_field, [])
-        for field, json_field in financial_fields.items()
-    }
+    num_years = len(years)
+
+    columns = {"business_id": [business_id] * num_years, "year": list(years)}
+    for field, json_field in FINANCIAL_FIELDS.items():
+        array = list(data.get(json_field, [])[:num_years])
+        columns[field] = array + [None] * (num_years - len(array))
+    return columns
 
-    financial_rows = []
-    for idx, year_value in enumerate(years):
-        year = clean_year(year_value)
-        row = {
-            "business_id": business_id,
-            "year": year,
-        }
-        for field, array in financial_arrays.items():
-            row[field] = array[idx] if idx < len(array) and array[idx] != "" else None
-        financial_rows.append(row)
-
-    # scale the financial values
-    for year_row in financial_rows:
-        year_row["turnover"] = (
-            float(year_row["turnover"]) * 1000 if year_row["turnover"] else None
-        )
-        year_row["operating_profit"] = (
-            float(year_row["operating_profit"]) * 1000
-            if year_row["operating_profit"]
-            else None
-        )
-        year_row["net_income"] = (
-            float(year_row["net_income"]) * 1000
-            if year_row["balance_sheet_total"]
-            else None
-        )
 
-    return financial_rows
+def normalize_financial_details(columns: dict) -> pd.DataFrame:
+    """
+    Parses the merged raw financial columns of all companies in one vectorized pass.
+    Empty strings and malformed numerics become NaN, and the values reported in
+    thousands of euros are scaled to euros.
+    """
+    df = pd.DataFrame(columns)
+    if df.empty:
+        return df
+
+    df["year"] = df["year"].astype(str).str[:4]
+    values = df[list(FINANCIAL_FIELDS)].apply(pd.to_numeric, errors="coerce")
+    values[list(FINANCIAL_THOUSANDS_COLUMNS)] *= 1000
+    df[list(FINANCIAL_FIELDS)] = values.astype("float64")
+    return df
 
 
 def extract_company_decision_persons(data, business_id):
@@ -199,54 +266,778 @@ def extract_extended_decision_persons(data: dict, business_id: str) -> list:
     return rows
 
 
-def main(data_path: str, output_path: str) -> None:
-    json_files = [f for f in os.listdir(data_path) if f.endswith(".json")]
+OUTPUT_TABLES = (
+    "basic_details.csv",
+    "financial_details.csv",
+    "main_decision_makers.csv",
+    "all_decision_makers.csv",
+)
+
+
+def records_to_columns(records: list) -> dict:
+    columns = {}
+    for record in records:
+        for key, value in record.items():
+            columns.setdefault(key, []).append(value)
+    return columns
 
-    basic_details, financial_details, main_decision_makers, all_decision_makers = (
-        [],
-        [],
-        [],
-        [],
+
+def extract_company_tables(
+    data: dict, json_file_name: str, translations: Translations
+) -> dict:
+    """
+    Returns the rows of one company for every output table in columnar form,
+    {table file name: {column: [values]}}.
+    """
+    business_id = data.get("businessId")
+    print(business_id)
+    basic_details = extract_basic_company_details(
+        data, json_file_name, business_id, translations
     )
+    return {
+        "basic_details.csv": records_to_columns([basic_details]),
+        "financial_details.csv": extract_company_financial_details(data, business_id),
+        "main_decision_makers.csv": records_to_columns(
+            extract_company_decision_persons(data, business_id)
+        ),
+        "all_decision_makers.csv": records_to_columns(
+            extract_extended_decision_persons(data, business_id)
+        ),
+    }
+
+
+COMPANY_DATA_PATH = (
+    "props",
+    "pageProps",
+    "dehydratedState",
+    "queries",
+    0,
+    "state",
+    "data",
+)
+
+_JSON_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"')
+# unrolled so that every byte can only be consumed one way, a nested quantifier
+# backtracks exponentially on a container that is never closed
+_JSON_NEXT_BRACKET = re.compile(
+    rb'[^"{}\[\]]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}\[\]]*)*([{}\[\]])'
+)
+_JSON_SCALAR = re.compile(rb"[^,}\]\s]+")
+_JSON_WHITESPACE = re.compile(rb"\s*")
+
+
+def _skip_whitespace(buffer, pos: int) -> int:
+    return _JSON_WHITESPACE.match(buffer, pos).end()
 
+
+def _match(pattern: re.Pattern, buffer, pos: int) -> re.Match:
+    match = pattern.match(buffer, pos)
+    if match is None:
+        raise ValueError(f"Truncated or invalid JSON at offset {pos}")
+    return match
+
+
+def _skip_value(buffer, pos: int) -> int:
+    """
+    Returns the end offset of the JSON value starting at pos without decoding it.
+    Containers are skipped by matching brackets outside of string literals.
+    """
+    first = buffer[pos : pos + 1]
+    if first == b'"':
+        return _match(_JSON_STRING, buffer, pos).end()
+    if first not in (b"{", b"["):
+        return _match(_JSON_SCALAR, buffer, pos).end()
+
+    # anchored at the end of the previous bracket rather than searched, so a
+    # truncated container fails after one linear scan
+    depth = 0
+    while True:
+        match = _match(_JSON_NEXT_BRACKET, buffer, pos)
+        depth += 1 if match.group(1) in (b"{", b"[") else -1
+        pos = match.end()
+        if depth == 0:
+            return pos
+
+
+def _find_child(buffer, pos: int, key) -> int:
+    """
+    Returns the offset of the value stored under key (object member name or
+    array index) of the container starting at pos.
+    """
+    opening = b"[" if isinstance(key, int) else b"{"
+    closing = b"]" if isinstance(key, int) else b"}"
+    if pos >= len(buffer):
+        raise ValueError(f"Truncated JSON at offset {pos}")
+    if buffer[pos : pos + 1] != opening:
+        raise KeyError(key)
+
+    pos = _skip_whitespace(buffer, pos + 1)
+    index = 0
+    while buffer[pos : pos + 1] != closing:
+        if isinstance(key, int):
+            if index == key:
+                return pos
+        else:
+            name_match = _match(_JSON_STRING, buffer, pos)
+            pos = _skip_whitespace(buffer, name_match.end())
+            pos = _skip_whitespace(buffer, pos + 1)  # ":"
+            if json.loads(name_match.group()) == key:
+                return pos
+
+        pos = _skip_whitespace(buffer, _skip_value(buffer, pos))
+        if buffer[pos : pos + 1] == b",":
+            pos = _skip_whitespace(buffer, pos + 1)
+        index += 1
+    raise KeyError(key)
+
+
+def extract_json_subtree(buffer, path: tuple):
+    """
+    Decodes only the value at path, e.g. ("props", "pageProps", 0), from a JSON
+    document held in a bytes-like buffer. Everything outside of that subtree is
+    skipped over without building Python objects for it.
+    """
+    pos = _skip_whitespace(buffer, 0)
+    for key in path:
+        pos = _find_child(buffer, pos, key)
+    return json.loads(buffer[pos : _skip_value(buffer, pos)])
+
+
+def load_company_data(file_path: str) -> dict:
+    with open(file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return extract_json_subtree(buffer, COMPANY_DATA_PATH)
+
+
+def load_company_data_full(file_path: str) -> dict:
+    with open(file_path, "r", encoding="utf-8") as f:
+        raw_data = json.load(f)
+    return raw_data["props"]["pageProps"]["dehydratedState"]["queries"][0]["state"][
+        "data"
+    ]
+
+
+def merge_columns(target: dict, partial: dict) -> None:
+    for key, values in partial.items():
+        target.setdefault(key, []).extend(values)
+
+
+def process_json_files(
+    data_path: str, json_files: list, cached_hashes: dict = None
+) -> tuple:
+    """
+    Extracts a chunk of scraped JSON files into columnar partial tables,
+    i.e. {json file name: {table file name: {column: [values]}}}, plus the
+    translation stats of the chunk and the sha256 of every file.
+
+    Args:
+        data_path (str): Directory with the scraped JSON files.
+        json_files (list): File names of the chunk.
+        cached_hashes (dict, optional): {file name: sha256 in the manifest}. If
+            set, files are hashed from the bytes read for the extraction, and a
+            file whose hash matches gets None instead of its tables. If None (no
+            manifest) nothing is hashed.
+    """
+    translations = Translations.from_yml()
+    partials, hashes = {}, {}
     for json_file_name in json_files:
-        with open(os.path.join(data_path, json_file_name), "r", encoding="utf-8") as f:
-            raw_data = json.load(f)
-
-            data = raw_data["props"]["pageProps"]["dehydratedState"]["queries"][0][
-                "state"
-            ]["data"]
-
-            business_id = data.get("businessId")
-            print(business_id)
-            basic_details.append(
-                extract_basic_company_details(data, json_file_name, business_id)
-            )
-            financial_details.extend(
-                extract_company_financial_details(data, business_id)
-            )
-            main_decision_makers.extend(
-                extract_company_decision_persons(data, business_id)
-            )
-            all_decision_makers.extend(
-                extract_extended_decision_persons(data, business_id)
-            )
-
-    output_tables = {
-        "basic_details.csv": basic_details,
-        "financial_details.csv": financial_details,
-        "main_decision_makers.csv": main_decision_makers,
-        "all_decision_makers.csv": all_decision_makers,
-    }
+        file_path = os.path.join(data_path, json_file_name)
+        if cached_hashes is None:
+            data = load_company_data(file_path)
+        else:
+            with open(file_path, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    hashes[json_file_name] = hashlib.sha256(buffer).hexdigest()
+                    if hashes[json_file_name] == cached_hashes.get(json_file_name):
+                        partials[json_file_name] = None
+                        continue
+                    data = extract_json_subtree(buffer, COMPANY_DATA_PATH)
+        partials[json_file_name] = extract_company_tables(
+            data, json_file_name, translations
+        )
+    return partials, translations.stats(), hashes
+
+
+def process_store_records(raw_store_path: str, records: list) -> tuple:
+    """
+    Same as process_json_files for a chunk of raw page store records, read
+    sequentially from the store segments.
+    """
+    translations = Translations.from_yml()
+    partials, hashes = {}, {}
+    for record, page in iter_records(raw_store_path, records):
+        data = extract_json_subtree(page, COMPANY_DATA_PATH)
+        json_file_name = f"{record.business_id}.json"
+        partials[json_file_name] = extract_company_tables(
+            data, json_file_name, translations
+        )
+        hashes[json_file_name] = record.sha256
+    return partials, translations.stats(), hashes
+
+
+def run_chunks(
+    func, source: str, chunks: list, workers: int, chunk_args: list = None
+) -> list:
+    """
+    Runs func(source, chunk) for every chunk, or func(source, chunk, chunk_arg)
+    with the matching item of chunk_args.
+    """
+    args = [[source] * len(chunks), chunks]
+    if chunk_args is not None:
+        args.append(chunk_args)
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(func, *args))
+    return [func(*chunk_args) for chunk_args in zip(*args)]
+
+
+def chunked(items: list, chunk_size: int) -> list:
+    return [items[i : i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+
+SUMMARY_DIMENSIONS = ("year", "main_line_of_business_category", "city")
+SUMMARY_QUANTILES = {"p10": 0.1, "p25": 0.25, "p50": 0.5, "p75": 0.75, "p90": 0.9}
+# the breakdowns and metrics the overview notebook reads, {dimensions: metrics or
+# None for all}. The summary ships with the site, so other breakdowns are better
+# computed from financial_details where needed.
+SUMMARY_GROUPINGS = {
+    ("year",): None,
+    ("main_line_of_business_category",): ("num_employees",),
+}
+
+
+def build_company_counts(basic_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Number of companies per sector and city. Counts are additive, so any coarser
+    breakdown is a sum over this table.
+    """
+    dimensions = list(SUMMARY_DIMENSIONS[1:])
+    if basic_df.empty:
+        return pd.DataFrame(columns=dimensions + ["companies"])
+    return (
+        basic_df.groupby(dimensions, dropna=False)
+        .size()
+        .rename("companies")
+        .reset_index()
+    )
+
+
+def build_financial_summary(
+    financial_df: pd.DataFrame, basic_df: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Aggregates the financial metrics of each of the SUMMARY_GROUPINGS: row count,
+    sum and the SUMMARY_QUANTILES. Medians and quantiles cannot be combined
+    across groups, so each breakdown is computed from the detail rows rather than
+    rolled up. The grouping column names the dimensions of a row, e.g. "year", the
+    others are empty.
+    """
+    dimensions = [
+        dimension
+        for dimension in SUMMARY_DIMENSIONS
+        if any(dimension in grouping for grouping in SUMMARY_GROUPINGS)
+    ]
+    columns = ["grouping", *dimensions, "metric", "count", "sum"]
+    columns += list(SUMMARY_QUANTILES)
+    if financial_df.empty:
+        return pd.DataFrame(columns=columns)
+
+    details = financial_df.merge(
+        basic_df[["business_id", *SUMMARY_DIMENSIONS[1:]]].drop_duplicates(
+            "business_id"
+        ),
+        on="business_id",
+        how="left",
+    ).melt(
+        id_vars=list(SUMMARY_DIMENSIONS),
+        value_vars=list(FINANCIAL_FIELDS),
+        var_name="metric",
+    )
+    details = details.dropna(subset=["value"])
+    if details.empty:
+        return pd.DataFrame(columns=columns)
+
+    summaries = []
+    for grouping, metrics in SUMMARY_GROUPINGS.items():
+        rows = details if metrics is None else details[details["metric"].isin(metrics)]
+        grouped = rows.groupby([*grouping, "metric"])["value"]
+        if grouped.ngroups == 0:
+            continue
+        summary = grouped.agg(["count", "sum"])
+        quantiles = grouped.quantile(list(SUMMARY_QUANTILES.values())).unstack()
+        quantiles.columns = list(SUMMARY_QUANTILES)
+        summary = summary.join(quantiles).reset_index()
+        summary.insert(0, "grouping", ",".join(grouping))
+        summaries.append(summary)
+    if not summaries:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(summaries, ignore_index=True).reindex(columns=columns)
+
+
+CATEGORICAL_COLUMNS = {
+    "basic_details.csv": (
+        "province",
+        "city",
+        "company_form",
+        "main_line_of_business",
+        "main_line_of_business_category",
+    ),
+    "main_decision_makers.csv": ("position_text", "gender", "status_id"),
+    "all_decision_makers.csv": ("position_text", "status_id"),
+    "summary_company_counts.csv": ("main_line_of_business_category", "city"),
+    "summary_financials.csv": (
+        "grouping",
+        "main_line_of_business_category",
+        "city",
+        "metric",
+    ),
+}
+
+
+_COORDINATES = re.compile(
+    r"^\(?\s*([-+]?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)\s*,"
+    r"\s*([-+]?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)\s*\)?$"
+)
+
+
+def coordinate_columns(coordinates: pd.Series) -> pd.DataFrame:
+    """
+    Float lat and lon columns of the coordinates column of basic_details tables
+    written before the ETL split it, holding (lat, lon) tuples or their
+    "(lat, lon)" csv form. Anything else becomes NaN.
+    """
+    text = coordinates.map(
+        lambda c: (
+            f"{c[0]},{c[1]}" if isinstance(c, (tuple, list)) and len(c) == 2 else c
+        )
+    )
+    parts = text.astype("string").str.extract(_COORDINATES)
+    # astype parses the repr of a float back exactly, pd.to_numeric does not
+    return pd.DataFrame(
+        {"lat": parts[0].astype("Float64"), "lon": parts[1].astype("Float64")},
+        index=coordinates.index,
+    ).astype("float64")
+
+
+def location_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Validated float64 lat and lon columns of a basic_details table, invalid
+    coordinates become NaN.
+    """
+    if "coordinates" in df.columns:
+        locations = coordinate_columns(df["coordinates"])
+    else:
+        locations = df.reindex(columns=["lat", "lon"]).apply(
+            pd.to_numeric, errors="coerce"
+        )
+    locations = locations.astype("float64")
+    valid = map_clusters.valid_coordinates(locations["lat"], locations["lon"])
+    locations.loc[~valid] = float("nan")
+    return locations
+
+
+def apply_schema(df: pd.DataFrame, table: str) -> pd.DataFrame:
+    """
+    Casts a company_info table to its columnar schema: integer business ids,
+    categorical sectors and cities, float64 financials and split lat/lon.
+    """
+    df = df.copy()
+    if "business_id" in df.columns:
+        df["business_id"] = pd.to_numeric(df["business_id"], errors="coerce").astype(
+            "Int64"
+        )
+
+    if table == "basic_details.csv":
+        locations = location_columns(df)
+        df = df.drop(columns=["coordinates"], errors="ignore")
+        df[["lat", "lon"]] = locations
+
+    if table in ("financial_details.csv", "summary_financials.csv"):
+        df["year"] = pd.to_numeric(df["year"], errors="coerce").astype("Int16")
+    if table == "financial_details.csv":
+        for column in FINANCIAL_FIELDS:
+            df[column] = pd.to_numeric(df[column], errors="coerce").astype("float64")
+
+    for column in CATEGORICAL_COLUMNS.get(table, ()):
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    return df
+
+
+def write_table(
+    columns: dict, output_path: str, filename: str, output_format: str = "csv"
+) -> None:
+    """
+    Args:
+        columns (dict | pd.DataFrame): Columnar table data, {column: [values]}.
+        output_path (str): Output directory.
+        filename (str): Table file name, e.g. basic_details.csv.
+        output_format (str): "csv", or "both" for a parquet copy next to the csv.
+            The csv is always written, the site, the url loader and
+            --summaries-only all read it.
+    """
+    df = columns if isinstance(columns, pd.DataFrame) else pd.DataFrame(columns)
+    parquet_path = os.path.join(output_path, filename.replace(".csv", ".parquet"))
+    df.to_csv(os.path.join(output_path, filename), index=False)
+    if output_format == "both":
+        apply_schema(df, filename).to_parquet(parquet_path, index=False)
+    elif os.path.exists(parquet_path):
+        # the notebooks prefer the parquet copy, a stale one would hide the csv
+        os.remove(parquet_path)
+
+
+MANIFEST_VERSION = 3
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path: str, translations_hash: str) -> dict:
+    """
+    Returns the cached {json file name: entry} mapping of the previous run, or an
+    empty one when the manifest is missing or was built with other translations.
+    """
+    if not manifest_path or not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "rb") as f:
+        manifest = pickle.load(f)
+    if (
+        manifest.get("version") != MANIFEST_VERSION
+        or manifest.get("translations") != translations_hash
+    ):
+        return {}
+    return manifest["files"]
+
+
+def save_manifest(manifest_path: str, translations_hash: str, files: dict) -> None:
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(
+            {
+                "version": MANIFEST_VERSION,
+                "translations": translations_hash,
+                "files": files,
+            },
+            f,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(tmp_path, manifest_path)
+
+
+def split_changed_files(data_path: str, json_files: list, cached: dict) -> tuple:
+    """
+    Compares the source files against the manifest by mtime and size. Touched
+    files are hashed by the workers that extract them, see process_json_files, and
+    keep their rows if the content hash still matches.
+
+    Returns:
+        tuple: ({file name: unchanged manifest entry}, [touched or new file names], {file name: (None, mtime, size)})
+    """
+    unchanged, changed, fingerprints = {}, [], {}
+    for json_file_name in json_files:
+        stat = os.stat(os.path.join(data_path, json_file_name))
+        entry = cached.get(json_file_name)
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            unchanged[json_file_name] = entry
+        else:
+            changed.append(json_file_name)
+            fingerprints[json_file_name] = (None, stat.st_mtime, stat.st_size)
+    return unchanged, changed, fingerprints
+
+
+def split_changed_records(records: dict, cached: dict) -> tuple:
+    """
+    Same as split_changed_files for raw page store records, whose content hash is
+    already known from the store index.
+    """
+    unchanged, changed, fingerprints = {}, [], {}
+    for json_file_name, record in records.items():
+        entry = cached.get(json_file_name)
+        if entry and entry["sha256"] == record.sha256:
+            unchanged[json_file_name] = entry
+        else:
+            changed.append(json_file_name)
+            fingerprints[json_file_name] = (record.sha256, None, None)
+    return unchanged, changed, fingerprints
+
+
+def write_summaries(
+    basic_df: pd.DataFrame,
+    financial_df: pd.DataFrame,
+    output_path: str,
+    output_format: str = "csv",
+) -> None:
+    """
+    Writes the summary tables the overview notebook reads instead of the detail rows.
+    """
+    write_table(
+        build_company_counts(basic_df),
+        output_path,
+        "summary_company_counts.csv",
+        output_format,
+    )
+    write_table(
+        build_financial_summary(financial_df, basic_df),
+        output_path,
+        "summary_financials.csv",
+        output_format,
+    )
+
+
+def write_locations(
+    basic_df: pd.DataFrame, output_path: str, output_format: str = "csv"
+) -> None:
+    """
+    Writes the company locations sorted by grid cell with their bounding box index,
+    see map_clusters.location_index, and the per zoom level location clusters of
+    the overview notebook map, see map_clusters.cluster_locations.
+    """
+    locations = basic_df.reindex(columns=["business_id", "name"]).join(
+        location_columns(basic_df)
+    )
+    located = locations.dropna(subset=["lat", "lon"])
+    outside = (~map_clusters.in_bbox(located["lat"], located["lon"])).sum()
+    print(
+        f"{len(located)} of {len(locations)} companies located, "
+        f"{outside} outside Finland"
+    )
+
+    company_locations, index = map_clusters.location_index(located)
+    write_table(company_locations, output_path, "company_locations.csv", output_format)
+    write_table(index, output_path, "location_index.csv", output_format)
+    write_table(
+        map_clusters.cluster_locations(located),
+        output_path,
+        "map_clusters.csv",
+        output_format,
+    )
+
+
+def write_director_network(
+    all_decision_makers_df: pd.DataFrame,
+    main_decision_makers_df: pd.DataFrame,
+    basic_df: pd.DataFrame,
+    output_path: str,
+    output_format: str = "csv",
+) -> None:
+    """
+    Writes the company interlock network of the decision makers and its node
+    statistics, see director_network.company_network.
+    """
+    memberships = director_network.company_memberships(
+        all_decision_makers_df, main_decision_makers_df, basic_df
+    )
+    companies, interlocks = director_network.company_network(memberships)
+    print(
+        f"Director network: {len(memberships)} memberships, "
+        f"{len(companies)} companies, {len(interlocks)} interlocks"
+    )
+    write_table(companies, output_path, "director_companies.csv", output_format)
+    write_table(interlocks, output_path, "director_interlocks.csv", output_format)
+
+
+def main(
+    data_path: str,
+    output_path: str,
+    workers: int = 1,
+    chunk_size: int = 64,
+    manifest_path: str = None,
+    output_format: str = "csv",
+    raw_store_path: str = None,
+) -> None:
+    """
+    Args:
+        data_path (str): Directory with the scraped JSON files.
+        output_path (str): Directory the csv tables are written to.
+        workers (int): Number of worker processes. 1 runs serially in-process.
+        chunk_size (int): Number of files handed to a worker at a time.
+        manifest_path (str, optional): If set, only new or changed files are
+            re-extracted and the rows of the others are reused from this manifest.
+        output_format (str): "csv", or "both" for typed parquet copies of the
+            tables next to the csvs.
+        raw_store_path (str, optional): If set, the latest snapshot of every company
+            is read from this raw page store instead of data_path.
+    """
+    translations_hash = file_sha256("data/translations.yml")
+    cached = load_manifest(manifest_path, translations_hash)
+
+    if raw_store_path:
+        with RawPageStore(raw_store_path) as store:
+            records = {f"{r.business_id}.json": r for r in store.latest_records()}
+        json_files = list(records)
+        unchanged, changed, fingerprints = split_changed_records(records, cached)
+        chunks = chunked([records[name] for name in changed], max(chunk_size, 1))
+        results = run_chunks(process_store_records, raw_store_path, chunks, workers)
+    else:
+        json_files = [f for f in os.listdir(data_path) if f.endswith(".json")]
+        unchanged, changed, fingerprints = split_changed_files(
+            data_path, json_files, cached
+        )
+        chunks = chunked(changed, max(chunk_size, 1))
+        cached_hashes = None
+        if manifest_path:
+            cached_hashes = [
+                {name: cached[name]["sha256"] for name in chunk if name in cached}
+                for chunk in chunks
+            ]
+        results = run_chunks(
+            process_json_files, data_path, chunks, workers, cached_hashes
+        )
+
+    extracted = {}
+    translation_stats = {"lookups": 0, "misses": 0, "unknown": {}}
+    for partials, partial_stats, hashes in results:
+        for json_file_name, tables in partials.items():
+            _, mtime, size = fingerprints[json_file_name]
+            if tables is None:
+                # touched, but the content hash matches the manifest
+                unchanged[json_file_name] = {
+                    **cached[json_file_name],
+                    "mtime": mtime,
+                    "size": size,
+                }
+            else:
+                extracted[json_file_name] = tables
+                fingerprints[json_file_name] = (
+                    hashes.get(json_file_name),
+                    mtime,
+                    size,
+                )
+        merge_translation_stats(translation_stats, partial_stats)
+
+    print(
+        f"{len(extracted)} new or changed files, {len(unchanged)} unchanged, "
+        f"{len(set(cached) - set(json_files))} deleted"
+    )
+
+    print(
+        f"Translation lookups: {translation_stats['lookups']}, "
+        f"misses: {translation_stats['misses']}"
+    )
+    for section, names in translation_stats["unknown"].items():
+        for name, count in sorted(names.items()):
+            print(f"Unknown {section} entry ({count}x): {name}")
+
+    files = dict(unchanged)
+    for json_file_name, tables in extracted.items():
+        sha256, mtime, size = fingerprints[json_file_name]
+        files[json_file_name] = {
+            "sha256": sha256,
+            "mtime": mtime,
+            "size": size,
+            "tables": tables,
+        }
+
+    output_tables = {table: {} for table in OUTPUT_TABLES}
+    for json_file_name in json_files:
+        for table, columns in files[json_file_name]["tables"].items():
+            merge_columns(output_tables[table], columns)
+    output_tables["financial_details.csv"] = normalize_financial_details(
+        output_tables["financial_details.csv"]
+    )
 
     os.makedirs(output_path, exist_ok=True)
 
-    for filename, records in output_tables.items():
-        df = pd.DataFrame(records)
-        df.to_csv(os.path.join(output_path, filename), index=False)
+    for filename, columns in output_tables.items():
+        write_table(columns, output_path, filename, output_format)
+    basic_df = pd.DataFrame(output_tables["basic_details.csv"])
+    write_summaries(
+        basic_df, output_tables["financial_details.csv"], output_path, output_format
+    )
+    write_locations(basic_df, output_path, output_format)
+    write_director_network(
+        pd.DataFrame(output_tables["all_decision_makers.csv"]),
+        pd.DataFrame(output_tables["main_decision_makers.csv"]),
+        basic_df,
+        output_path,
+        output_format,
+    )
+
+    if manifest_path:
+        save_manifest(manifest_path, translations_hash, files)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build company_info csv tables")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes, 1 runs serially",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=64, help="Files per worker task"
+    )
+    parser.add_argument(
+        "--format",
+        choices=["csv", "both"],
+        default="both",
+        help="Output format of the company_info tables, both adds a parquet copy "
+        "of every csv",
+    )
+    parser.add_argument(
+        "--source",
+        choices=["auto", "store", "json"],
+        default="auto",
+        help="Read the raw page store or the scraped JSON directory. "
+        "auto uses the store when it exists",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Re-extract every file instead of only new or changed ones",
+    )
+    parser.add_argument(
+        "--summaries-only",
+        action="store_true",
+        help="Only rebuild the summary, location and director network tables from "
+        "the existing company_info csvs",
+    )
+    args = parser.parse_args()
+
     input_path = os.path.join("data", "scraped_raw_jsons")
+    raw_store_path = os.path.join("data", "raw_store")
+    use_store = args.source == "store" or (
+        args.source == "auto" and os.path.exists(raw_store_path)
+    )
     output_path = os.path.join("data", "company_info")
-    main(input_path, output_path)
+    manifest_path = os.path.join("data", "etl_manifest.pickle")
+    if args.summaries_only:
+        basic_df = pd.read_csv(os.path.join(output_path, "basic_details.csv"))
+        write_summaries(
+            basic_df,
+            pd.read_csv(os.path.join(output_path, "financial_details.csv")),
+            output_path,
+            args.format,
+        )
+        write_locations(basic_df, output_path, args.format)
+        all_decision_makers_path = os.path.join(output_path, "all_decision_makers.csv")
+        write_director_network(
+            pd.read_csv(all_decision_makers_path)
+            if os.path.exists(all_decision_makers_path)
+            else pd.DataFrame(
+                columns=["business_id", "decision_person_id", "full_name"]
+            ),
+            pd.read_csv(os.path.join(output_path, "main_decision_makers.csv")),
+            basic_df,
+            output_path,
+            args.format,
+        )
+        raise SystemExit
+    if args.full and os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    main(
+        input_path,
+        output_path,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        manifest_path=manifest_path,
+        output_format=args.format,
+        raw_store_path=raw_store_path if use_store else None,
+    )
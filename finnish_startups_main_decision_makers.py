@@ -8,37 +8,53 @@ app = marimo.App(width="medium")
 
 @app.cell
 def _():
-    import io
     import marimo as mo
+    import numpy as np
     import pandas as pd
     import networkx as nx
     import plotly.graph_objects as go
-    from collections import Counter
     from urllib.request import urlopen
 
-    return Counter, go, io, mo, nx, pd, urlopen
+    # used by director_network, imported here so the WASM export installs it
+    import scipy
+
+    return go, mo, np, nx, pd, scipy, urlopen
 
 
 @app.cell
-def _(io, mo, pd, urlopen):
+def _(mo, urlopen):
+    import sys as _sys
+    import importlib as _importlib
+
+    def _import_local(name: str):
+        try:
+            return _importlib.import_module(name)
+        except ModuleNotFoundError:
+            # WASM export: scripts/build.py publishes the module next to the notebook
+            with urlopen(str(mo.notebook_location() / f"{name}.py")) as response:
+                with open(f"{name}.py", "wb") as f:
+                    f.write(response.read())
+            if "." not in _sys.path:
+                _sys.path.insert(0, ".")
+            return _importlib.import_module(name)
+
+    data_loader = _import_local("data_loader")
+    director_network = _import_local("director_network")
+    return data_loader, director_network
+
+
+@app.cell
+def _(mo):
     main_decision_makers_path = str(
         mo.notebook_location() / "data" / "company_info" / "main_decision_makers.csv"
     )
 
-    def load_data(path):
-        if path.startswith("http"):
-            with urlopen(path) as response:
-                data = response.read().decode("utf-8")
-                return pd.read_csv(io.StringIO(data))
-        else:
-            return pd.read_csv(path)
-
-    return load_data, main_decision_makers_path
+    return (main_decision_makers_path,)
 
 
 @app.cell
-def _(load_data, main_decision_makers_path):
-    main_decision_makers_df = load_data(main_decision_makers_path)
+def _(data_loader, main_decision_makers_path):
+    main_decision_makers_df = data_loader.load_data(main_decision_makers_path)
     main_decision_makers_df.info()
     return (main_decision_makers_df,)
 
@@ -56,64 +72,63 @@ def _(main_decision_makers_df):
 
 
 @app.cell
-def _(go, main_decision_makers_df, nx, pd):
-    def build_graph_from_df(df: pd.DataFrame) -> nx.Graph:
-        df = df[
-            ["business_id", "decision_person_id", "first_name", "last_name"]
-        ].dropna(subset=["decision_person_id", "business_id"])
-        df["label"] = df["first_name"].fillna("") + " " + df["last_name"].fillna("")
-        edges = (
-            df[["business_id", "decision_person_id"]]
-            .drop_duplicates()
-            .merge(df[["business_id", "decision_person_id"]], on="business_id")
-        )
-        edges = edges[edges["decision_person_id_x"] < edges["decision_person_id_y"]]
-        edges = (
-            edges.groupby(["decision_person_id_x", "decision_person_id_y"])
-            .size()
-            .reset_index(name="weight")
-        )
-        G = nx.Graph()
-        for _, row in edges.iterrows():
-            G.add_edge(
-                row["decision_person_id_x"],
-                row["decision_person_id_y"],
-                weight=row["weight"],
-            )
-        label_map = df.drop_duplicates("decision_person_id").set_index(
-            "decision_person_id"
-        )["label"]
-        for node in G.nodes():
-            G.nodes[node]["label"] = label_map.get(node, str(node))
-        return G
+def _(director_network, main_decision_makers_df):
+    coboard_df = main_decision_makers_df.dropna(
+        subset=["decision_person_id", "business_id"]
+    )
+    coboard_adjacency, person_ids = director_network.coboard_matrix(coboard_df)
+    person_labels = director_network.person_labels(coboard_df)
+    return coboard_adjacency, person_ids, person_labels
+
+
+@app.cell
+def _(coboard_adjacency, mo):
+    max_weight = int(coboard_adjacency.max()) if coboard_adjacency.nnz else 1
+    min_weight_slider = mo.ui.slider(
+        start=1, stop=max(max_weight, 2), value=1, label="Minimum shared companies"
+    )
+    min_degree_slider = mo.ui.slider(
+        start=1, stop=10, value=1, label="Minimum connections"
+    )
+    mo.hstack([min_weight_slider, min_degree_slider], justify="start")
+    return min_degree_slider, min_weight_slider
+
+
+@app.cell
+def _(
+    coboard_adjacency,
+    director_network,
+    min_degree_slider,
+    min_weight_slider,
+    person_ids,
+    person_labels,
+):
+    filtered_adjacency, filtered_person_ids = director_network.filter_adjacency(
+        coboard_adjacency,
+        person_ids,
+        min_weight=min_weight_slider.value,
+        min_degree=min_degree_slider.value,
+    )
+    graph = director_network.to_networkx(
+        filtered_adjacency, filtered_person_ids, person_labels
+    )
+    print(graph)
+    return filtered_adjacency, graph
 
 
-    def filter_graph(G: nx.Graph, min_degree: int = 1, min_weight: int = 1) -> nx.Graph:
-        Gf = G.copy()
-        for u, v, d in list(Gf.edges(data=True)):
-            if d["weight"] < min_weight:
-                Gf.remove_edge(u, v)
-        low_degree_nodes = [n for n, d in Gf.degree() if d < min_degree]
-        Gf.remove_nodes_from(low_degree_nodes)
-        return Gf
-
-
-    def graph_to_plotly(G: nx.Graph) -> go.Figure:
-        pos = nx.spring_layout(G, seed=42)
-        edge_x, edge_y = [], []
-        for u, v in G.edges():
-            x0, y0 = pos[u]
-            x1, y1 = pos[v]
-            edge_x += [x0, x1, None]
-            edge_y += [y0, y1, None]
-
-        node_x, node_y, labels, degrees = [], [], [], []
-        for node in G.nodes():
-            x, y = pos[node]
-            node_x.append(x)
-            node_y.append(y)
-            labels.append(G.nodes[node]["label"])
-            degrees.append(G.degree[node])
+@app.cell
+def _(director_network, go, np, nx):
+    def graph_to_plotly(G: nx.Graph, layout: str = "auto") -> go.Figure:
+        """
+        Args:
+            G (nx.Graph): Graph with a label on every node.
+            layout (str): Layout method of director_network.layout_positions.
+        """
+        pos = director_network.layout_positions(G, method=layout)
+        nodes, node_xy, edge_x, edge_y = director_network.plot_coordinates(G, pos)
+        node_x, node_y = node_xy[:, 0], node_xy[:, 1]
+        labels = [G.nodes[node]["label"] for node in nodes]
+        degrees = np.array([degree for _, degree in G.degree(nodes)])
 
         edge_trace = go.Scatter(
             x=edge_x,
@@ -131,7 +146,7 @@ def _(go, main_decision_makers_df, nx, pd):
             textposition="top center",
             hoverinfo="text",
             marker=dict(
-                size=[3 + d for d in degrees],
+                size=3 + degrees,
                 color=degrees,
                 colorscale="Viridis",
                 colorbar=dict(title="Degree"),
@@ -145,19 +160,7 @@ def _(go, main_decision_makers_df, nx, pd):
         )
         return fig
 
-
-    def visualize_decision_graph(
-        df: pd.DataFrame, min_degree: int = 1, min_weight: int = 1
-    ) -> go.Figure:
-        G = build_graph_from_df(df)
-        Gf = filter_graph(G, min_degree, min_weight)
-        return Gf
-
-    graph = visualize_decision_graph(
-        main_decision_makers_df, min_degree=1, min_weight=1
-    )
-    print(graph)
-    return graph, graph_to_plotly
+    return (graph_to_plotly,)
 
 
 @app.cell
@@ -167,11 +170,9 @@ def _(graph, graph_to_plotly):
 
 
 @app.cell
-def _(Counter, go, graph, nx):
-    def plot_component_size_distribution(G: nx.Graph, min_size: int) -> go.Figure:
-        sizes = [len(c) for c in nx.connected_components(G) if len(c) >= min_size]
-        counts = Counter(sizes)
-        x, y = zip(*sorted(counts.items())) if counts else ([], [])
+def _(director_network, filtered_adjacency, go):
+    def plot_component_size_distribution(adjacency, min_size: int) -> go.Figure:
+        x, y = director_network.component_size_histogram(adjacency, min_size)
 
         fig = go.Figure(data=[go.Bar(x=x, y=y)])
         fig.update_layout(
@@ -183,7 +184,149 @@ def _(Counter, go, graph, nx):
         )
         return fig
 
-    plot_component_size_distribution(graph, min_size=2)
+    plot_component_size_distribution(filtered_adjacency, min_size=2)
+    return
+
+
+@app.cell
+def _(mo):
+    mo.md(
+        r"""
+        ## Director Network
+
+        Companies are linked when they share a decision maker. The network and its statistics are precomputed by `etl.py` from `all_decision_makers.csv`, see `director_network.company_network`.
+        """
+    )
+    return
+
+
+@app.cell
+def _(data_loader, mo):
+    try:
+        director_companies_df = data_loader.load_data(
+            str(
+                mo.notebook_location()
+                / "data"
+                / "company_info"
+                / "director_companies.csv"
+            )
+        )
+        director_interlocks_df = data_loader.load_data(
+            str(
+                mo.notebook_location()
+                / "data"
+                / "company_info"
+                / "director_interlocks.csv"
+            )
+        )
+    except OSError:
+        director_companies_df = director_interlocks_df = None
+    return director_companies_df, director_interlocks_df
+
+
+@app.cell
+def _(director_companies_df, director_interlocks_df, mo):
+    mo.stop(
+        director_companies_df is None,
+        mo.md("The director network tables have not been built. Run `python etl.py`."),
+    )
+    mo.stop(
+        director_interlocks_df.empty,
+        mo.md(
+            f"None of the **{len(director_companies_df):,}** companies share a decision maker, so there are no interlocks to show."
+        ),
+    )
+    mo.md(
+        f"""
+        - **{len(director_companies_df):,}** companies, **{len(director_interlocks_df):,}** interlocks
+        - The largest connected group has **{director_companies_df["component_size"].max():,}** companies
+        """
+    )
+    return
+
+
+@app.cell
+def _(director_companies_df, director_interlocks_df, go, mo, pd):
+    def plot_top_interlocked_companies(
+        companies_df: pd.DataFrame, top_n: int = 20
+    ) -> go.Figure:
+        top = companies_df.nlargest(top_n, "pagerank").iloc[::-1]
+        fig = go.Figure(
+            data=[
+                go.Bar(
+                    x=top["pagerank"],
+                    y=top["name"].fillna(top["company"]),
+                    orientation="h",
+                    customdata=top[["degree", "people"]],
+                    hovertemplate="%{y}<br>PageRank %{x:.5f}<br>"
+                    "%{customdata[0]} interlocked companies<br>"
+                    "%{customdata[1]} decision makers<extra></extra>",
+                )
+            ]
+        )
+        fig.update_layout(
+            title=f"Top {top_n} Companies by PageRank in the Interlock Network",
+            xaxis_title="PageRank",
+            margin=dict(l=250, r=50, t=80, b=50),
+            template="plotly_white",
+        )
+        return fig
+
+    mo.stop(director_companies_df is None or director_interlocks_df.empty)
+    plot_top_interlocked_companies(director_companies_df)
+    return
+
+
+@app.cell
+def _(director_companies_df, director_interlocks_df, go, mo, pd):
+    def plot_interlock_component_sizes(companies_df: pd.DataFrame) -> go.Figure:
+        sizes = (
+            companies_df.drop_duplicates("component")["component_size"]
+            .value_counts()
+            .sort_index()
+        )
+        fig = go.Figure(data=[go.Bar(x=sizes.index, y=sizes.values)])
+        fig.update_layout(
+            title="Connected Groups of Interlocked Companies",
+            xaxis_title="Group Size",
+            yaxis_title="Number of Groups",
+            xaxis_type="log",
+            bargap=0.2,
+            template="plotly_white",
+        )
+        return fig
+
+    mo.stop(director_companies_df is None or director_interlocks_df.empty)
+    plot_interlock_component_sizes(director_companies_df)
+    return
+
+
+@app.cell
+def _(director_companies_df, director_interlocks_df, graph_to_plotly, mo, nx):
+    def interlock_graph(companies_df, interlocks_df, top_n: int = 150) -> nx.Graph:
+        """
+        Interlock graph of the top_n companies by PageRank.
+        """
+        top = companies_df.nlargest(top_n, "pagerank")
+        keys = set(top["company"])
+        edges = interlocks_df[
+            interlocks_df["source"].isin(keys) & interlocks_df["target"].isin(keys)
+        ]
+        G = nx.from_pandas_edgelist(
+            edges.rename(columns={"shared_people": "weight"}),
+            "source",
+            "target",
+            edge_attr="weight",
+        )
+        nx.set_node_attributes(
+            G,
+            dict(zip(top["company"], top["name"].fillna(top["company"]))),
+            "label",
+        )
+        return G
+
+    mo.stop(director_companies_df is None or director_interlocks_df.empty)
+    graph_to_plotly(interlock_graph(director_companies_df, director_interlocks_df))
     return
 
 
@@ -22,21 +22,42 @@ def _(mo):
 @app.cell
 def _():
     import os
-    import io
 
     import marimo as mo
     import pandas as pd
     import plotly.express as px
     import plotly.graph_objects as go
     from urllib.request import urlopen
+    import numpy as np
     import folium
-    from folium.plugins import MarkerCluster
+    from branca.element import MacroElement, Template
 
-    return MarkerCluster, folium, io, mo, pd, px, urlopen
+    return MacroElement, Template, folium, mo, np, pd, px, urlopen
 
 
 @app.cell
-def _(io, mo, pd, urlopen):
+def _(mo, urlopen):
+    import sys as _sys
+    import importlib as _importlib
+
+    def _import_local(name: str):
+        try:
+            return _importlib.import_module(name)
+        except ModuleNotFoundError:
+            # WASM export: scripts/build.py publishes the module next to the notebook
+            with urlopen(str(mo.notebook_location() / f"{name}.py")) as response:
+                with open(f"{name}.py", "wb") as f:
+                    f.write(response.read())
+            if "." not in _sys.path:
+                _sys.path.insert(0, ".")
+            return _importlib.import_module(name)
+
+    data_loader = _import_local("data_loader")
+    return (data_loader,)
+
+
+@app.cell
+def _(data_loader, mo):
     company_data_path = str(
         mo.notebook_location() / "data" / "company_info" / "basic_details.csv"
     )
@@ -44,17 +65,39 @@ def _(io, mo, pd, urlopen):
         mo.notebook_location() / "data" / "company_info" / "financial_details.csv"
     )
 
-    def load_data(path):
-        if path.startswith("http"):
-            with urlopen(path) as response:
-                data = response.read().decode("utf-8")
-                return pd.read_csv(io.StringIO(data))
-        else:
-            return pd.read_csv(path)
+    company_info_df = data_loader.load_data(company_data_path)
+    financial_df = data_loader.load_data(financials_df_path)
 
-    company_info_df = load_data(company_data_path)
-    financial_df = load_data(financials_df_path)
-    return company_info_df, financial_df
+    # precomputed by etl.py, see build_company_counts and build_financial_summary
+    company_counts_df = data_loader.load_data(
+        str(
+            mo.notebook_location()
+            / "data"
+            / "company_info"
+            / "summary_company_counts.csv"
+        )
+    )
+    financial_summary_df = data_loader.load_data(
+        str(mo.notebook_location() / "data" / "company_info" / "summary_financials.csv")
+    )
+    map_clusters_df = data_loader.load_data(
+        str(mo.notebook_location() / "data" / "company_info" / "map_clusters.csv")
+    )
+    company_locations_df = data_loader.load_data(
+        str(mo.notebook_location() / "data" / "company_info" / "company_locations.csv")
+    )
+    location_index_df = data_loader.load_data(
+        str(mo.notebook_location() / "data" / "company_info" / "location_index.csv")
+    )
+    return (
+        company_counts_df,
+        company_info_df,
+        company_locations_df,
+        financial_df,
+        financial_summary_df,
+        location_index_df,
+        map_clusters_df,
+    )
 
 
 @app.cell
@@ -126,18 +169,19 @@ def _(mo):
 
 
 @app.cell
-def _(company_info_df, pd, px):
+def _(company_counts_df, pd, px):
     def plot_business_by_city(
-        df: pd.DataFrame, column: str = "main_line_of_business", top_n: int = None
+        df: pd.DataFrame, column: str = "city", top_n: int = None
     ) -> None:
         """
         Args:
-            df (pd.DataFrame): The input DataFrame.
+            df (pd.DataFrame): Company counts per sector and city.
             column (str): The column to group and plot.
             top_n (int, optional): If set, only the top N categories are shown.
         """
+        counts = df.groupby(column, observed=True)["companies"].sum()
         category_counts = (
-            df[column].dropna().value_counts(normalize=True).mul(100).reset_index()
+            counts.div(counts.sum()).mul(100).sort_values(ascending=False).reset_index()
         )
         category_counts.columns = [column, "percentage"]
 
@@ -160,7 +204,7 @@ def _(company_info_df, pd, px):
 
         return fig
 
-    plot_business_by_city(df=company_info_df, column="city", top_n=15)
+    plot_business_by_city(df=company_counts_df, column="city", top_n=15)
     return
 
 
@@ -179,17 +223,9 @@ def _(mo):
 
 
 @app.cell
-def _(company_info_df, pd, px):
+def _(company_locations_df, pd, px):
     def plot_company_locations_map(df: pd.DataFrame):
-        df = df[["business_id", "name", "coordinates"]].dropna()
-        df = df[df["coordinates"].str.contains(",")]
-
-        df["coordinates"] = df["coordinates"].str.replace(r"[() ]", "", regex=True)
-        df[["lat", "lon"]] = df["coordinates"].str.split(",", expand=True)
-        df["lat"] = pd.to_numeric(df["lat"], errors="coerce")
-        df["lon"] = pd.to_numeric(df["lon"], errors="coerce")
-        df = df.dropna(subset=["lat", "lon"])
-
+        # validated float lat/lon of the located companies, see etl.write_locations
         fig = px.scatter_map(
             df,
             lat="lat",
@@ -204,7 +240,7 @@ def _(company_info_df, pd, px):
         fig.update_layout(margin={"r": 0, "t": 50, "l": 0, "b": 0})
         return fig
 
-    plot_company_locations_map(company_info_df)
+    plot_company_locations_map(company_locations_df)
     return
 
 
@@ -215,34 +251,168 @@ def _(mo):
 
 
 @app.cell
-def _(MarkerCluster, company_info_df, folium, pd):
-    def plot_clustered_company_locations(df: pd.DataFrame):
-        df = df[["business_id", "name", "coordinates"]].dropna()
-        df = df[df["coordinates"].str.contains(",")]
+def _(
+    MacroElement,
+    Template,
+    company_locations_df,
+    folium,
+    location_index_df,
+    map_clusters_df,
+    np,
+    pd,
+):
+    import json as _json
+    from html import escape as _escape
+
+    class ViewportLayer(MacroElement):
+        """
+        Draws the clusters of the current zoom level that fall inside the visible
+        part of the map, redrawn whenever it moves. Zoomed in past the finest
+        cluster level, the companies themselves are drawn instead, read from the
+        rows of the index cells whose bounding box overlaps the visible area.
+        Companies sharing a location get one marker listing all of them.
+        """
 
-        df["coordinates"] = df["coordinates"].str.replace(r"[() ]", "", regex=True)
-        df[["lat", "lon"]] = df["coordinates"].str.split(",", expand=True)
-        df["lat"] = pd.to_numeric(df["lat"], errors="coerce")
-        df["lon"] = pd.to_numeric(df["lon"], errors="coerce")
-        df = df.dropna(subset=["lat", "lon"])
+        _template = Template(
+            """
+            {% macro script(this, kwargs) %}
+            (function () {
+                var map = {{ this._parent.get_name() }};
+                // [zoom, lat, lon, companies, popup]
+                var clusters = {{ this.clusters }};
+                // [lat_min, lat_max, lon_min, lon_max, start, stop]
+                var cells = {{ this.cells }};
+                // [lat, lon, popup], sorted by index cell
+                var companies = {{ this.companies }};
+                var layer = L.layerGroup().addTo(map);
+
+                function addCircle(lat, lon, count, popup) {
+                    L.circleMarker([lat, lon], {
+                        radius: 5 + 3 * Math.log2(count),
+                        weight: 1,
+                        fillOpacity: 0.6,
+                    })
+                        .bindTooltip(String(count))
+                        .bindPopup(popup, {maxHeight: 240})
+                        .addTo(layer);
+                }
 
-        m = folium.Map(
-            location=[df["lat"].mean(), df["lon"].mean()],
-            zoom_start=6,
-            tiles="CartoDB positron",
-            control_scale=True,
+                function showCompanies(bounds) {
+                    var points = {};
+                    cells.forEach(function (cell) {
+                        if (
+                            cell[1] < bounds.getSouth() || cell[0] > bounds.getNorth() ||
+                            cell[3] < bounds.getWest() || cell[2] > bounds.getEast()
+                        ) {
+                            return;
+                        }
+                        for (var i = cell[4]; i < cell[5]; i++) {
+                            var company = companies[i];
+                            if (!bounds.contains([company[0], company[1]])) {
+                                continue;
+                            }
+                            var key = company[0] + "," + company[1];
+                            points[key] = points[key] || {
+                                lat: company[0], lon: company[1], popups: []
+                            };
+                            points[key].popups.push(company[2]);
+                        }
+                    });
+                    Object.values(points).forEach(function (point) {
+                        addCircle(
+                            point.lat, point.lon, point.popups.length,
+                            point.popups.join("<br><br>")
+                        );
+                    });
+                }
+
+                function showView() {
+                    var bounds = map.getBounds().pad(0.25);
+                    layer.clearLayers();
+                    if (map.getZoom() > {{ this.max_zoom }}) {
+                        showCompanies(bounds);
+                        return;
+                    }
+                    var zoom = Math.max(map.getZoom(), {{ this.min_zoom }});
+                    clusters.forEach(function (cluster) {
+                        if (cluster[0] === zoom && bounds.contains([cluster[1], cluster[2]])) {
+                            addCircle(cluster[1], cluster[2], cluster[3], cluster[4]);
+                        }
+                    });
+                }
+
+                map.on("moveend", showView);
+                showView();
+            })();
+            {% endmacro %}
+            """
         )
-        marker_cluster = MarkerCluster().add_to(m)
 
-        for _, row in df.iterrows():
-            popup = f"<b>{row['name']}</b><br>ID: {row['business_id']}"
-            folium.Marker(location=[row["lat"], row["lon"]], popup=popup).add_to(
-                marker_cluster
+        def __init__(
+            self, clusters: pd.DataFrame, locations: pd.DataFrame, index: pd.DataFrame
+        ):
+            super().__init__()
+            self._name = "ViewportLayer"
+            self.min_zoom = int(clusters["zoom"].min())
+            self.max_zoom = int(clusters["zoom"].max())
+            self.clusters = self.to_js(
+                [
+                    [int(c.zoom), c.lat, c.lon, int(c.companies), self.popup(c)]
+                    for c in clusters.itertuples()
+                ]
+            )
+            self.cells = self.to_js(
+                index[
+                    ["lat_min", "lat_max", "lon_min", "lon_max", "start", "stop"]
+                ].values.tolist()
+            )
+            self.companies = self.to_js(
+                [[c.lat, c.lon, self.popup(c)] for c in locations.itertuples()]
             )
 
+        @staticmethod
+        def popup(row) -> str:
+            if getattr(row, "companies", 1) > 1:
+                return f"<b>{row.companies}</b> companies"
+            return f"<b>{_escape(str(row.name))}</b><br>ID: {_escape(str(row.business_id))}"
+
+        @staticmethod
+        def to_js(values: list) -> str:
+            # "</" would end the script tag the map is embedded in
+            return _json.dumps(values).replace("</", "<\\/")
+
+    def plot_clustered_company_locations(
+        clusters: pd.DataFrame,
+        locations: pd.DataFrame,
+        index: pd.DataFrame,
+        zoom_start: int = 6,
+    ):
+        """
+        Args:
+            clusters (pd.DataFrame): Location clusters per zoom level, written by
+                etl.py (see map_clusters.cluster_locations).
+            locations (pd.DataFrame): Located companies sorted by index cell and
+            index (pd.DataFrame): Their bounding box index, both written by etl.py
+                (see map_clusters.location_index).
+            zoom_start (int): Initial zoom level of the map.
+        """
+        coarsest = clusters[clusters["zoom"] == clusters["zoom"].min()]
+        m = folium.Map(
+            location=[
+                np.average(coarsest["lat"], weights=coarsest["companies"]),
+                np.average(coarsest["lon"], weights=coarsest["companies"]),
+            ],
+            zoom_start=zoom_start,
+            tiles="CartoDB positron",
+            control_scale=True,
+            prefer_canvas=True,
+        )
+        ViewportLayer(clusters, locations, index).add_to(m)
         return m
 
-    plot_clustered_company_locations(company_info_df)
+    plot_clustered_company_locations(
+        map_clusters_df, company_locations_df, location_index_df
+    )
     return
 
 
@@ -339,32 +509,22 @@ def _(mo):
 
 
 @app.cell
-def _(company_info_df, financial_df, pd, px):
+def _(financial_summary_df, pd, px):
     def plot_business_categories_by_employees(
-        financial_df: pd.DataFrame, company_info_df: pd.DataFrame, top_n: int = None
+        financial_summary_df: pd.DataFrame, top_n: int = None
     ) -> None:
         """
         Args:
-            financial_df (pd.DataFrame): Financial data containing business_id and num_employees.
-            company_info_df (pd.DataFrame): Company info containing business_id and main_line_of_business.
+            financial_summary_df (pd.DataFrame): Financial summary containing the
+                num_employees sums per main_line_of_business_category.
             top_n (int, optional): If set, only the top N categories are shown.
         """
-        merged_df = pd.merge(
-            financial_df[["business_id", "num_employees"]],
-            company_info_df[["business_id", "main_line_of_business_category"]],
-            on="business_id",
-            how="inner",
-        )
-
-        merged_df = merged_df.dropna(
-            subset=["num_employees", "main_line_of_business_category"]
-        )
-
-        category_employees = (
-            merged_df.groupby("main_line_of_business_category")["num_employees"]
-            .sum()
-            .reset_index()
-        )
+        df = financial_summary_df
+        category_employees = df.loc[
+            (df["grouping"] == "main_line_of_business_category")
+            & (df["metric"] == "num_employees"),
+            ["main_line_of_business_category", "sum"],
+        ].rename(columns={"sum": "num_employees"})
 
         category_employees = category_employees.sort_values(
             "num_employees", ascending=False
@@ -392,7 +552,7 @@ def _(company_info_df, financial_df, pd, px):
 
         return fig
 
-    plot_business_categories_by_employees(financial_df, company_info_df, 15)
+    plot_business_categories_by_employees(financial_summary_df, 15)
     return
 
 
@@ -566,20 +726,16 @@ def _(mo):
 
 
 @app.cell
-def _(financial_df, pd, px):
-    def plot_median_financials_over_time(financial_df: pd.DataFrame):
-        df = financial_df.copy()
+def _(financial_summary_df, pd, px):
+    def plot_median_financials_over_time(financial_summary_df: pd.DataFrame):
+        df = financial_summary_df
         df_grouped = (
-            df.groupby("year")
-            .agg(
-                {
-                    "turnover": "median",
-                    "operating_profit": "median",
-                    "net_income": "median",
-                }
-            )
+            df[df["grouping"] == "year"]
+            .pivot(index="year", columns="metric", values="p50")
+            .reindex(columns=["turnover", "operating_profit", "net_income"])
             .reset_index()
         )
+        df_grouped.columns.name = None
 
         df_melted = df_grouped.melt(
             id_vars="year", var_name="metric", value_name="value"
@@ -596,7 +752,7 @@ def _(financial_df, pd, px):
         )
         return fig
 
-    plot_median_financials_over_time(financial_df)
+    plot_median_financials_over_time(financial_summary_df)
     return
 
 
@@ -616,20 +772,16 @@ def _(mo):
 
 
 @app.cell
-def _(financial_df, pd, px):
-    def plot_median_ratios_over_time(financial_df: pd.DataFrame):
-        df = financial_df.copy()
+def _(financial_summary_df, pd, px):
+    def plot_median_ratios_over_time(financial_summary_df: pd.DataFrame):
+        df = financial_summary_df
         df_grouped = (
-            df.groupby("year")
-            .agg(
-                {
-                    "quick_ratio": "median",
-                    "current_ratio": "median",
-                    "solvency_ratio": "median",
-                }
-            )
+            df[df["grouping"] == "year"]
+            .pivot(index="year", columns="metric", values="p50")
+            .reindex(columns=["quick_ratio", "current_ratio", "solvency_ratio"])
             .reset_index()
         )
+        df_grouped.columns.name = None
 
         df_melted = df_grouped.melt(
             id_vars="year", var_name="metric", value_name="value"
@@ -647,7 +799,7 @@ def _(financial_df, pd, px):
         fig.update_layout(yaxis_title="Median Ratio Value")
         return fig
 
-    plot_median_ratios_over_time(financial_df)
+    plot_median_ratios_over_time(financial_summary_df)
     return
 
 
@@ -1,15 +1,48 @@
 """
 This script generates heatmaps from Dealroom's VC funding data.
+
+Run it to render the heatmaps of every pivot csv in data/dealroom to images/, with
+the titles, transforms and colorscales of data/dealroom/heatmaps.yml.
 """
 
 import os
+import glob
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
+import yaml
 import numpy as np
 import pandas as pd
-from scipy.stats import boxcox
+from numpy.dtypes import StringDType
+from scipy.stats import boxcox, boxcox_normmax, rankdata
+from scipy.cluster.hierarchy import leaves_list, linkage
 
+import plotly
 import plotly.graph_objects as go
 
+VALUE_UNITS = ((1e9, "B"), (1e6, "M"), (1e3, "K"))
+
+HEATMAP_DEFAULTS = {
+    "colorscale": "Blues",
+    "transform": "log",
+    "showscale": False,
+    "downsample": True,
+}
+HEATMAP_WIDTH = 1920
+HEATMAP_HEIGHT = 1080
+# pivots with more rows or columns than fit the plot area at this cell size are
+# aggregated into blocks
+MIN_CELL_PIXELS = 12
+# rows are clustered hierarchically up to this many, beyond they are ordered by
+# their peak column
+CLUSTER_MAX_ROWS = 4000
+HEATMAP_MANIFEST = "heatmaps_manifest.json"
+
+_BOXCOX_LAMBDAS = {}
+
 
 def format_value(val):
     if val >= 1e9:
@@ -22,30 +55,214 @@ def format_value(val):
         return f"${int(val)}"
 
 
-def plot_heatmap(
+def format_values(values) -> np.ndarray:
+    """
+    format_value of every element of an array, computed per unit on whole arrays.
+    NaN and infinite values get an empty label.
+    """
+    values = np.asarray(values, dtype=float)
+    labels = np.zeros(values.shape, dtype=StringDType())
+    remaining = np.isfinite(values)
+    for unit, suffix in VALUE_UNITS:
+        mask = remaining & (values >= unit)
+        remaining &= ~mask
+        if unit == 1e9:
+            # one decimal: format the rounded number of tenths
+            tenths = values[mask] / 1e8
+            rounded = np.rint(tenths).astype(np.int64)
+            text = np.strings.add(
+                np.strings.add((rounded // 10).astype(StringDType()), "."),
+                (rounded % 10).astype(StringDType()),
+            )
+            # x.x5 billions can round the other way than "%.1f" after dividing
+            ties = np.abs(tenths - np.floor(tenths) - 0.5) < 1e-6
+            text[ties] = [f"{value / 1e9:.1f}" for value in values[mask][ties]]
+        else:
+            text = np.rint(values[mask] / unit).astype(np.int64).astype(StringDType())
+        labels[mask] = np.strings.add(np.strings.add("$", text), suffix)
+    text = np.trunc(values[remaining]).astype(np.int64).astype(StringDType())
+    labels[remaining] = np.strings.add("$", text)
+    return labels
+
+
+def boxcox_lambda(values: np.ndarray) -> float:
+    """
+    Maximum likelihood Box-Cox lambda of values, cached per dataset so re-rendering
+    a pivot does not re-run the optimizer.
+    """
+    key = hashlib.sha256(np.ascontiguousarray(values).tobytes()).hexdigest()
+    if key not in _BOXCOX_LAMBDAS:
+        _BOXCOX_LAMBDAS[key] = boxcox_normmax(values, method="mle")
+    return _BOXCOX_LAMBDAS[key]
+
+
+def boxcox_values(values: np.ndarray) -> np.ndarray:
+    return boxcox(values, boxcox_lambda(values))
+
+
+def rank_values(values: np.ndarray) -> np.ndarray:
+    return rankdata(values) / len(values)
+
+
+# transform: (mask of the values it applies to, function of those values, fill
+# value of the others)
+TRANSFORMS = {
+    "none": None,
+    "log": (lambda z: ~np.isnan(z), np.log1p, np.nan),
+    "asinh": (lambda z: ~np.isnan(z), np.arcsinh, np.nan),
+    "boxcox": (lambda z: z > 0, boxcox_values, 0.0),
+    "rank": (np.isfinite, rank_values, np.nan),
+}
+
+
+def transform_values(values, transform: str = "log") -> np.ndarray:
+    """
+    Args:
+        values (array-like): Values of the heatmap cells.
+        transform (str): "log" for log1p, "boxcox" for the Box-Cox transform of the
+            positive values (the others become 0), "asinh", "rank" for the
+            percentile rank or "none".
+
+    Returns:
+        np.ndarray: Float array of the same shape as values.
+    """
+    if transform not in TRANSFORMS:
+        raise ValueError(f"Unknown transform: {transform}")
+    z = np.asarray(values, dtype=float)
+    if TRANSFORMS[transform] is None:
+        return z
+    domain, function, fill = TRANSFORMS[transform]
+    mask = domain(z)
+    if not mask.any():
+        return z
+    transformed = np.full(z.shape, fill)
+    transformed[mask] = function(z[mask])
+    return transformed
+
+
+def heatmap_capacity(width: int = HEATMAP_WIDTH, height: int = HEATMAP_HEIGHT) -> tuple:
+    """
+    Number of rows and columns of MIN_CELL_PIXELS cells that fit the plot area of
+    a figure, leaving room for the title and the axis labels.
+    """
+    return (height - 250) // MIN_CELL_PIXELS, (width - 250) // MIN_CELL_PIXELS
+
+
+def is_large_pivot(pivot_df: pd.DataFrame) -> bool:
+    """
+    Whether the pivot has more rows or columns than fit the figure, and so is
+    clustered and downsampled by build_heatmap.
+    """
+    max_rows, max_columns = heatmap_capacity()
+    return len(pivot_df.index) > max_rows or len(pivot_df.columns) > max_columns
+
+
+def order_rows(pivot_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reorders the rows so that rows with similar funding profiles are adjacent:
+    average linkage clustering of the log funding rows scaled to unit length, or
+    for more than CLUSTER_MAX_ROWS rows their peak column and total.
+    """
+    if len(pivot_df) < 3:
+        return pivot_df
+    profiles = np.log1p(np.clip(np.nan_to_num(pivot_df.to_numpy(float)), 0, None))
+    if len(pivot_df) <= CLUSTER_MAX_ROWS:
+        norms = np.linalg.norm(profiles, axis=1, keepdims=True)
+        profiles = np.divide(profiles, norms, out=profiles, where=norms > 0)
+        order = leaves_list(linkage(profiles, method="average"))
+    else:
+        order = np.lexsort((-profiles.sum(axis=1), profiles.argmax(axis=1)))
+    return pivot_df.iloc[order]
+
+
+def block_edges(size: int, max_blocks: int) -> np.ndarray:
+    """
+    Start positions of at most max_blocks contiguous, near equal blocks of size
+    items, followed by size.
+    """
+    return np.unique(np.linspace(0, size, min(size, max_blocks) + 1).round()).astype(
+        int
+    )
+
+
+def block_labels(labels: list, edges: np.ndarray, separator: str) -> list:
+    return [
+        str(labels[start])
+        if stop - start == 1
+        else f"{labels[start]}{separator}{labels[stop - 1]}"
+        for start, stop in zip(edges[:-1], edges[1:])
+    ]
+
+
+def downsample_pivot(
+    pivot_df: pd.DataFrame, max_rows: int, max_columns: int
+) -> pd.DataFrame:
+    """
+    Sums contiguous blocks of rows and columns so that the pivot has at most
+    max_rows rows and max_columns columns. Funding amounts are additive, so a
+    block holds the total funding of its rows and columns. Row blocks are labeled
+    "first .. last" in row order and column blocks "first – last", e.g. the
+    months of a quarter.
+    """
+    row_edges = block_edges(len(pivot_df.index), max_rows)
+    column_edges = block_edges(len(pivot_df.columns), max_columns)
+    values = np.nan_to_num(pivot_df.to_numpy(float))
+    values = np.add.reduceat(values, row_edges[:-1], axis=0)
+    values = np.add.reduceat(values, column_edges[:-1], axis=1)
+    return pd.DataFrame(
+        values,
+        index=block_labels(list(pivot_df.index), row_edges, " .. "),
+        columns=block_labels(list(pivot_df.columns), column_edges, " – "),
+    )
+
+
+def pivot_block(
+    pivot_df: pd.DataFrame, rows=None, columns=None, downsample: bool = True
+) -> pd.DataFrame:
+    """
+    Drill-down into a block of a downsampled heatmap: the rows from rows[0] to
+    rows[1] in the order of the overview figure and the columns from columns[0] to
+    columns[1], both inclusive. None keeps all rows or columns. downsample is the
+    option the overview was built with.
+    """
+    if downsample and is_large_pivot(pivot_df):
+        pivot_df = order_rows(pivot_df)
+    if rows is not None:
+        pivot_df = pivot_df.loc[rows[0] : rows[1]]
+    if columns is not None:
+        pivot_df = pivot_df.loc[:, columns[0] : columns[1]]
+    return pivot_df
+
+
+def build_heatmap(
     pivot_df: pd.DataFrame,
     title: str,
     colorscale: str = "Blues",
     transform: str = "log",
     showscale: bool = False,
-) -> None:
+    downsample: bool = True,
+) -> go.Figure:
+    """
+    Args:
+        pivot_df (pd.DataFrame): Funding per category (rows) and period (columns).
+        title (str): Figure title.
+        colorscale (str): Plotly colorscale.
+        transform (str): Color transform of the funding, see transform_values.
+        showscale (bool): Show the colorbar.
+        downsample (bool): If the pivot has more rows or columns than fit the
+            figure, cluster the rows by similarity and aggregate both into blocks,
+            so only the visible resolution is written to the figure. Cell labels
+            are then only shown on hover.
+    """
+    large = is_large_pivot(pivot_df)
+    if downsample and large:
+        pivot_df = downsample_pivot(order_rows(pivot_df), *heatmap_capacity())
+
     z_raw = pivot_df.values
     x = pivot_df.columns.tolist()
     y = pivot_df.index.tolist()
-    text = [[format_value(val) for val in row] for row in z_raw]
-
-    if transform == "log":
-        z = np.log1p(z_raw)
-    elif transform == "boxcox":
-        flat_values = z_raw[z_raw > 0].flatten()
-        if flat_values.size > 0:
-            transformed, _ = boxcox(flat_values)
-            z = np.zeros_like(z_raw, dtype=float)
-            z[z_raw > 0] = transformed
-        else:
-            z = z_raw
-    else:
-        z = z_raw
+    text = format_values(z_raw)
+    z = transform_values(z_raw, transform)
 
     fig = go.Figure(
         data=go.Heatmap(
@@ -54,7 +271,7 @@ def plot_heatmap(
             y=y,
             colorscale=colorscale,
             text=text,
-            texttemplate="%{text}",
+            texttemplate=None if large else "%{text}",
             hovertemplate="Year: %{x}<br>Category: %{y}<br>Funding: %{text}<extra></extra>",
             colorbar=dict(title="Funding Scale"),
             showscale=showscale,
@@ -66,34 +283,248 @@ def plot_heatmap(
         xaxis=dict(title="Year", tickmode="linear", dtick=1),
         yaxis_title="Category",
         margin=dict(t=150, b=50),
-        height=1080,
-        width=1920,
+        height=HEATMAP_HEIGHT,
+        width=HEATMAP_WIDTH,
     )
     fig.update_xaxes(side="top")
-    fig.show()
+    if large:
+        # block labels like "2000-01 – 2000-03" would be read as dates
+        fig.update_xaxes(type="category", tickmode="auto", nticks=12, tickangle=0)
+        fig.update_yaxes(type="category")
+    return fig
+
+
+def plot_heatmap(
+    pivot_df: pd.DataFrame,
+    title: str,
+    colorscale: str = "Blues",
+    transform: str = "log",
+    showscale: bool = False,
+    downsample: bool = True,
+) -> None:
+    build_heatmap(pivot_df, title, colorscale, transform, showscale, downsample).show()
+
+
+def load_heatmap_config(config_path: str) -> dict:
+    """
+    Returns {figure name: figure options} of a heatmaps.yml, with the defaults
+    applied to every entry and kept under "defaults". An entry renders the pivot
+    csv named by its csv option (file name without extension), by default the one
+    named like the entry, so several figures can come from one pivot.
+    """
+    with open(config_path, "r", encoding="utf-8") as file:
+        config = yaml.safe_load(file) or {}
+    defaults = {**HEATMAP_DEFAULTS, **config.pop("defaults", {})}
+    config = {name: {**defaults, **options} for name, options in config.items()}
+    return {"defaults": defaults, **config}
+
+
+def find_pivot_csvs(inputs: list) -> list:
+    """
+    Expands csv paths, directories (every csv inside) and glob patterns.
+    """
+    paths = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "*.csv")
+        paths.extend(sorted(glob.glob(pattern)))
+    return list(dict.fromkeys(paths))
+
+
+def heatmap_jobs(csv_paths: list, config: dict, output_dir: str, formats: list):
+    """
+    One render job per config entry of a csv: its name, figure options and output
+    files. Csvs without a config entry are rendered with the defaults, titled by
+    their file name.
+    """
+    entries = {}
+    for name, options in config.items():
+        if name != "defaults":
+            entries.setdefault(options.get("csv", name), []).append((name, options))
+
+    jobs = []
+    for csv_path in csv_paths:
+        csv_name = os.path.splitext(os.path.basename(csv_path))[0]
+        defaults = config.get("defaults", HEATMAP_DEFAULTS)
+        for name, options in entries.get(csv_name, [(csv_name, defaults)]):
+            options = {"title": name, "output": name, **options}
+            outputs = [
+                os.path.join(output_dir, f"{options['output']}.{output_format}")
+                for output_format in formats
+            ]
+            jobs.append(
+                {
+                    "name": name,
+                    "csv_path": csv_path,
+                    "options": options,
+                    "outputs": outputs,
+                }
+            )
+    return jobs
+
+
+def job_hash(job: dict) -> str:
+    """
+    sha256 of the pivot csv, the figure options and the renderer version, so a
+    figure is re-rendered when any of them changes.
+    """
+    digest = hashlib.sha256()
+    with open(job["csv_path"], "rb") as f:
+        digest.update(f.read())
+    options = {key: job["options"][key] for key in sorted(job["options"])}
+    digest.update(repr((options, plotly.__version__)).encode())
+    return digest.hexdigest()
+
+
+def job_figure(job: dict) -> go.Figure:
+    """
+    Figure of a render job, of the drill-down block given by the rows and columns
+    options when set, see pivot_block.
+    """
+    options = job["options"]
+    pivot_df = pd.read_csv(job["csv_path"], index_col=0)
+    if options.get("rows") is not None or options.get("columns") is not None:
+        pivot_df = pivot_block(
+            pivot_df,
+            options.get("rows"),
+            options.get("columns"),
+            downsample=options["downsample"],
+        )
+    return build_heatmap(
+        pivot_df,
+        title=options["title"],
+        colorscale=options["colorscale"],
+        transform=options["transform"],
+        showscale=options["showscale"],
+        downsample=options["downsample"],
+    )
+
+
+def render_heatmap(job: dict) -> tuple:
+    """
+    Renders one job to its output files without opening a browser. Returns the
+    job's name, the seconds it took and the error message if it failed.
+    """
+    start = time.perf_counter()
+    try:
+        fig = job_figure(job)
+        for output in job["outputs"]:
+            if output.endswith(".html"):
+                fig.write_html(output, include_plotlyjs="cdn")
+            else:
+                fig.write_image(output)
+    except Exception as e:
+        return job["name"], time.perf_counter() - start, f"{type(e).__name__}: {e}"
+    return job["name"], time.perf_counter() - start, None
+
+
+def render_heatmaps(
+    jobs: list, manifest_path: str, workers: int = 1, force: bool = False
+) -> list:
+    """
+    Args:
+        jobs (list): Render jobs of heatmap_jobs.
+        manifest_path (str): Json file with the hash of every rendered job by name,
+            jobs whose hash did not change and whose outputs exist are skipped.
+        workers (int): Number of worker processes. 1 renders serially in-process.
+        force (bool): Render every job regardless of the manifest.
+
+    Returns:
+        list: (job name, error message) of the failed jobs.
+    """
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    pending = []
+    for job in jobs:
+        job["hash"] = job_hash(job)
+        up_to_date = manifest.get(job["name"]) == job["hash"] and all(
+            os.path.exists(output) for output in job["outputs"]
+        )
+        if up_to_date and not force:
+            print(f"Unchanged, skipped: {job['name']} ({job['csv_path']})")
+        else:
+            pending.append(job)
+
+    for output_dir in {os.path.dirname(o) for job in pending for o in job["outputs"]}:
+        os.makedirs(output_dir or ".", exist_ok=True)
+
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(render_heatmap, pending))
+    else:
+        results = [render_heatmap(job) for job in pending]
+
+    failures = []
+    for job, (name, seconds, error) in zip(pending, results):
+        if error:
+            print(f"Failed {name} after {seconds:.1f} s: {error}")
+            failures.append((name, error))
+            manifest.pop(name, None)
+        else:
+            print(f"Rendered {name} in {seconds:.1f} s: {', '.join(job['outputs'])}")
+            manifest[name] = job["hash"]
+
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return failures
 
 
 if __name__ == "__main__":
-    industry_csv_path = os.path.join(
-        os.getcwd(), "data", "dealroom", "vc_funding_by_industry.csv"
+    parser = argparse.ArgumentParser(
+        description="Render the Dealroom VC funding heatmaps to static files"
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        default=[os.path.join("data", "dealroom")],
+        help="Pivot csv files, directories or glob patterns",
     )
-    industry_df = pd.read_csv(filepath_or_buffer=industry_csv_path, index_col=0)
-    plot_heatmap(
-        industry_df,
-        title="VC Funding Worldwide by Industry Between 2000 and 2025<br><sup>Visualization by Tigran Khachatryan (github.com/geometrein) & data from dealroom.co</sup>",
-        colorscale="Plasma",
-        transform="boxcox",
-        showscale=False,
+    parser.add_argument(
+        "--config",
+        default=os.path.join("data", "dealroom", "heatmaps.yml"),
+        help="Titles, transforms and colorscales of the heatmaps",
     )
+    parser.add_argument("--output-dir", default="images")
+    parser.add_argument(
+        "--formats",
+        nargs="+",
+        choices=["png", "svg", "html"],
+        default=["png"],
+        help="Output formats, png and svg are written with kaleido",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes, 1 renders serially",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Re-render unchanged heatmaps too"
+    )
+    parser.add_argument(
+        "--show",
+        action="store_true",
+        help="Open the heatmaps in the browser instead of writing files",
+    )
+    args = parser.parse_args()
 
-    ai_industry_csv_path = os.path.join(
-        os.getcwd(), "data", "dealroom", "vc_funding_by_ai_category.csv"
+    config = load_heatmap_config(args.config)
+    jobs = heatmap_jobs(
+        find_pivot_csvs(args.inputs), config, args.output_dir, args.formats
     )
-    ai_industry_df = pd.read_csv(filepath_or_buffer=ai_industry_csv_path, index_col=0)
-    plot_heatmap(
-        ai_industry_df,
-        title="Venturing into Artificial Intelligence<br><sup>VC Funding worldwide by AI Industry Between 2000 and 2025</sup><br><sup>Visualization by Tigran Khachatryan (github.com/geometrein) & data from dealroom.co</sup>",
-        colorscale="Blues",
-        transform="log",
-        showscale=False,
+    if args.show:
+        for job in jobs:
+            job_figure(job).show()
+        raise SystemExit
+
+    failures = render_heatmaps(
+        jobs,
+        os.path.join(args.output_dir, HEATMAP_MANIFEST),
+        workers=args.workers,
+        force=args.force,
     )
+    if failures:
+        raise SystemExit(f"{len(failures)} of {len(jobs)} heatmaps failed")
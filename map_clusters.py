@@ -0,0 +1,165 @@
+"""
+Grid clustering and bounding box index of the company locations for the overview
+notebook maps.
+
+Locations are binned on the Web Mercator pixel grid of every zoom level of the map,
+in cells of CELL_PIXELS x CELL_PIXELS screen pixels, and every occupied cell becomes
+one cluster with its company count and centroid. Companies within FINLAND_BBOX
+fall into at most the grid cells covering it, 15 at zoom 4 and four times as many
+per zoom level, 4037 over zoom levels 4 to 8, however long the company list grows.
+Finer levels would approach one cluster per company (46637 cells at zoom 10), so
+MAX_ZOOM stops at 8. Zoomed in further, the overview map draws the companies of
+the visible area instead, looked up in the bounding box index of location_index.
+Companies geocoded outside Finland add at most one cluster each per zoom level.
+"""
+
+import numpy as np
+import pandas as pd
+
+MIN_ZOOM = 4
+MAX_ZOOM = 8
+CELL_PIXELS = 64
+TILE_PIXELS = 256
+INDEX_CELL_DEGREES = 0.5
+
+# lat_min, lat_max, lon_min, lon_max, with some margin around Åland and Lapland
+FINLAND_BBOX = (59.0, 70.5, 19.0, 32.0)
+
+CLUSTER_COLUMNS = [
+    "zoom",
+    "cell_x",
+    "cell_y",
+    "companies",
+    "lat",
+    "lon",
+    "lat_min",
+    "lat_max",
+    "lon_min",
+    "lon_max",
+    "business_id",
+    "name",
+]
+
+
+def valid_coordinates(lat, lon) -> np.ndarray:
+    """
+    Mask of the finite lat/lon pairs within the world's coordinate ranges. (0, 0)
+    is the placeholder of a missing geocode and counts as invalid.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    with np.errstate(invalid="ignore"):
+        return (np.abs(lat) <= 90) & (np.abs(lon) <= 180) & ~((lat == 0) & (lon == 0))
+
+
+def in_bbox(lat, lon, bbox: tuple = FINLAND_BBOX) -> np.ndarray:
+    lat_min, lat_max, lon_min, lon_max = bbox
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    return (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+
+
+def mercator_pixels(lat, lon, zoom: int) -> tuple:
+    """
+    Web Mercator pixel coordinates of lat/lon at a zoom level, as used by the map
+    tiles.
+    """
+    lat = np.clip(np.asarray(lat, dtype=float), -85.05112878, 85.05112878)
+    lon = np.asarray(lon, dtype=float)
+    world = TILE_PIXELS * 2.0**zoom
+    x = (lon + 180.0) / 360.0 * world
+    sin_lat = np.sin(np.radians(lat))
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)) * world
+    return x, y
+
+
+def cluster_locations(
+    df: pd.DataFrame,
+    min_zoom: int = MIN_ZOOM,
+    max_zoom: int = MAX_ZOOM,
+    cell_pixels: int = CELL_PIXELS,
+) -> pd.DataFrame:
+    """
+    Args:
+        df (pd.DataFrame): Companies with business_id, name, lat and lon columns.
+        min_zoom (int): Coarsest zoom level.
+        max_zoom (int): Finest zoom level, the map shows it for any closer zoom.
+        cell_pixels (int): Cell size in screen pixels.
+
+    Returns:
+        pd.DataFrame: One row per occupied cell and zoom level with the company
+            count, centroid and bounding box of the cell's companies. business_id
+            and name are only set for cells of a single company.
+    """
+    df = df.dropna(subset=["lat", "lon"])
+    if df.empty:
+        return pd.DataFrame(columns=CLUSTER_COLUMNS)
+
+    clusters = []
+    for zoom in range(min_zoom, max_zoom + 1):
+        x, y = mercator_pixels(df["lat"], df["lon"], zoom)
+        cells = df.assign(
+            cell_x=(x // cell_pixels).astype(np.int64),
+            cell_y=(y // cell_pixels).astype(np.int64),
+        )
+        cluster = (
+            cells.groupby(["cell_x", "cell_y"])
+            .agg(
+                companies=("lat", "size"),
+                lat=("lat", "mean"),
+                lon=("lon", "mean"),
+                lat_min=("lat", "min"),
+                lat_max=("lat", "max"),
+                lon_min=("lon", "min"),
+                lon_max=("lon", "max"),
+                business_id=("business_id", "first"),
+                name=("name", "first"),
+            )
+            .reset_index()
+        )
+        single = cluster["companies"] == 1
+        cluster["business_id"] = cluster["business_id"].where(single)
+        cluster["name"] = cluster["name"].where(single)
+        cluster.insert(0, "zoom", zoom)
+        clusters.append(cluster)
+    return pd.concat(clusters, ignore_index=True)[CLUSTER_COLUMNS]
+
+
+def location_index(df: pd.DataFrame, cell_degrees: float = INDEX_CELL_DEGREES) -> tuple:
+    """
+    Bounding box index of the company locations.
+
+    Args:
+        df (pd.DataFrame): Companies with business_id, name, lat and lon columns.
+        cell_degrees (float): Grid cell size in degrees.
+
+    Returns:
+        tuple: The located companies sorted by grid cell, with a cell column, and
+            the index with one row per occupied cell: the bounding box of its
+            companies and the start and stop rows of the cell in the companies.
+    """
+    locations = df.reindex(columns=["business_id", "name", "lat", "lon"]).dropna(
+        subset=["lat", "lon"]
+    )
+    row = np.floor((locations["lat"] + 90) / cell_degrees).astype(np.int64)
+    column = np.floor((locations["lon"] + 180) / cell_degrees).astype(np.int64)
+    locations = (
+        locations.assign(cell=row * int(np.ceil(360 / cell_degrees)) + column)
+        .sort_values(["cell", "business_id"], kind="stable")
+        .reset_index(drop=True)
+    )
+    index = (
+        locations.reset_index()
+        .groupby("cell")
+        .agg(
+            lat_min=("lat", "min"),
+            lat_max=("lat", "max"),
+            lon_min=("lon", "min"),
+            lon_max=("lon", "max"),
+            start=("index", "min"),
+            stop=("index", "max"),
+        )
+        .reset_index()
+    )
+    index["stop"] += 1
+    return locations, index
@@ -0,0 +1,232 @@
+"""
+Compressed, content-addressed store for the raw scraped company pages.
+
+Pages are stored as individually zstd-compressed records in append-only segment
+files. A sqlite index maps the content hash of every record to its position and
+keeps one snapshot row per scrape, so the history of a company is retained while
+identical re-scrapes cost no extra space.
+
+    python raw_store.py import data/scraped_raw_jsons
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from collections import namedtuple
+
+import zstandard
+
+StoreRecord = namedtuple(
+    "StoreRecord",
+    ["business_id", "scraped_at", "sha256", "segment", "offset", "length"],
+)
+
+
+def serialize_page(page) -> bytes:
+    if isinstance(page, (bytes, bytearray)):
+        return bytes(page)
+    return json.dumps(page, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class RawPageStore:
+    """
+    Args:
+        path (str): Directory of the segment files and the index.
+        segment_max_bytes (int): A new segment is started once the current one is
+            larger than this.
+        level (int): zstd compression level.
+    """
+
+    def __init__(
+        self,
+        path: str = os.path.join("data", "raw_store"),
+        segment_max_bytes: int = 256 * 1024 * 1024,
+        level: int = 10,
+    ):
+        self.path = path
+        self.segment_max_bytes = segment_max_bytes
+        self.level = level
+        self._lock = threading.Lock()
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        os.makedirs(path, exist_ok=True)
+        self._connection = sqlite3.connect(
+            os.path.join(path, "index.sqlite"), check_same_thread=False
+        )
+        with self._connection:
+            self._connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS blobs (
+                    sha256 TEXT PRIMARY KEY,
+                    segment TEXT NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    business_id TEXT NOT NULL,
+                    scraped_at REAL NOT NULL,
+                    sha256 TEXT NOT NULL REFERENCES blobs (sha256),
+                    PRIMARY KEY (business_id, scraped_at)
+                );
+                """
+            )
+
+    def _segment_path(self, segment: str) -> str:
+        return os.path.join(self.path, segment)
+
+    def _current_segment(self) -> str:
+        segments = sorted(f for f in os.listdir(self.path) if f.startswith("segment-"))
+        if segments:
+            latest = segments[-1]
+            if os.path.getsize(self._segment_path(latest)) < self.segment_max_bytes:
+                return latest
+        return f"segment-{len(segments):06d}.zst"
+
+    def put(self, business_id: str, page, scraped_at: float = None) -> str:
+        """
+        Stores a page snapshot. The page is only appended to a segment if no
+        record with the same content exists yet.
+
+        Returns:
+            str: Content hash of the page.
+        """
+        raw = serialize_page(page)
+        sha256 = hashlib.sha256(raw).hexdigest()
+        scraped_at = time.time() if scraped_at is None else scraped_at
+
+        with self._lock, self._connection:
+            exists = self._connection.execute(
+                "SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+            if not exists:
+                compressed = self._compressor.compress(raw)
+                segment = self._current_segment()
+                with open(self._segment_path(segment), "ab") as f:
+                    offset = f.tell()
+                    f.write(compressed)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._connection.execute(
+                    "INSERT INTO blobs (sha256, segment, offset, length) "
+                    "VALUES (?, ?, ?, ?)",
+                    (sha256, segment, offset, len(compressed)),
+                )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO snapshots (business_id, scraped_at, sha256) "
+                "VALUES (?, ?, ?)",
+                (business_id, scraped_at, sha256),
+            )
+        return sha256
+
+    def _records(self, where: str = "", params: tuple = ()) -> list:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT s.business_id, s.scraped_at, s.sha256, b.segment, b.offset, "
+                "b.length FROM snapshots s JOIN blobs b ON b.sha256 = s.sha256 "
+                f"{where}",
+                params,
+            ).fetchall()
+        return [StoreRecord(*row) for row in rows]
+
+    def latest_records(self) -> list:
+        """
+        Returns the latest snapshot of every company, ordered by position in the
+        segments so they can be read sequentially.
+        """
+        records = self._records(
+            "WHERE s.scraped_at = (SELECT MAX(scraped_at) FROM snapshots "
+            "WHERE business_id = s.business_id)"
+        )
+        return sorted(records, key=lambda r: (r.segment, r.offset))
+
+    def history(self, business_id: str) -> list:
+        records = self._records("WHERE s.business_id = ?", (business_id,))
+        return sorted(records, key=lambda r: r.scraped_at)
+
+    def latest_scraped_at(self, business_id: str):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT MAX(scraped_at) FROM snapshots WHERE business_id = ?",
+                (business_id,),
+            ).fetchone()
+        return row[0]
+
+    def get(self, business_id: str) -> dict:
+        history = self.history(business_id)
+        if not history:
+            raise KeyError(business_id)
+        return json.loads(read_records(self.path, [history[-1]])[0])
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> "RawPageStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def iter_records(path: str, records: list):
+    """
+    Yields (record, decompressed page bytes) for the given records, reading each
+    segment front to back with a single open file handle. Only needs the segment
+    files, so it can run in worker processes.
+    """
+    decompressor = zstandard.ZstdDecompressor()
+    handles = {}
+    try:
+        for record in records:
+            if record.segment not in handles:
+                handles[record.segment] = open(os.path.join(path, record.segment), "rb")
+            f = handles[record.segment]
+            f.seek(record.offset)
+            yield record, decompressor.decompress(f.read(record.length))
+    finally:
+        for f in handles.values():
+            f.close()
+
+
+def read_records(path: str, records: list) -> list:
+    return [page for _, page in iter_records(path, records)]
+
+
+def import_json_dir(store: RawPageStore, json_dir: str) -> int:
+    """
+    Imports the pretty-printed JSON files written by earlier scraper runs, using
+    the file modification time as the scrape time.
+    """
+    imported = 0
+    for json_file_name in sorted(os.listdir(json_dir)):
+        if not json_file_name.endswith(".json"):
+            continue
+        file_path = os.path.join(json_dir, json_file_name)
+        with open(file_path, "r", encoding="utf-8") as f:
+            page = json.load(f)
+        store.put(
+            json_file_name.replace(".json", ""),
+            page,
+            scraped_at=os.path.getmtime(file_path),
+        )
+        imported += 1
+    return imported
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the raw page store")
+    parser.add_argument(
+        "--store", default=os.path.join("data", "raw_store"), help="Store directory"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser(
+        "import", help="Import a directory of scraped JSON files"
+    )
+    import_parser.add_argument("json_dir")
+    args = parser.parse_args()
+
+    with RawPageStore(args.store) as store:
+        if args.command == "import":
+            print(f"Imported {import_json_dir(store, args.json_dir)} pages")
@@ -5,12 +5,20 @@ This script scrapes company data from a provider website and saves it in raw JSO
 import os
 import re
 import time
+import queue
+import sqlite3
 import logging
+import argparse
+import threading
 
 import json
-from random import randint
+from html import unescape
+from urllib.parse import quote, urljoin
+from contextlib import ExitStack, contextmanager
 
+import requests
 import pandas as pd
+from requests.adapters import HTTPAdapter
 
 from seleniumwire import webdriver
 from selenium.webdriver.common.by import By
@@ -18,10 +26,26 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+from raw_store import RawPageStore
+
 COMPANY_INFO_WEBSITE_URL = os.environ.get("COMPANY_INFO_WEBSITE_URL", None)
 
 LOGGER = logging.getLogger(__name__)
 
+SEARCH_PATH_TEMPLATE = "search?what={company_id}&type=company"
+COMPANY_LINK_PATTERN = re.compile(r"/\d{7}$")
+HREF_PATTERN = re.compile(r"""<a\b[^>]*?\bhref=["']([^"']+)["']""", re.IGNORECASE)
+NEXT_DATA_PATTERN = re.compile(
+    r"<script[^>]*\bid=[\"']__NEXT_DATA__[\"'][^>]*>(.*?)</script>", re.DOTALL
+)
+HTTP_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+    ),
+    "Accept-Language": "fi-FI,fi;q=0.9,en;q=0.8",
+}
+
 
 def close_ad_popup(driver: webdriver.Chrome):
     try:
@@ -41,46 +65,861 @@ def close_cookie_popup(driver: webdriver.Chrome):
         LOGGER.error(e)
 
 
-def get_company_details(company_id: str):
-    driver = webdriver.Chrome()
-    driver.get(url=COMPANY_INFO_WEBSITE_URL)
+def make_driver(headless: bool = True) -> webdriver.Chrome:
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+    options.add_argument("--window-size=1920,1080")
+    return webdriver.Chrome(options=options)
+
+
+class DriverPool:
+    """
+    Pool of long-lived Chrome drivers shared by the scraper workers.
+    Drivers are created lazily up to size and reused across companies.
+    A driver that raised while in use is quit and replaced on next checkout.
+    """
+
+    def __init__(self, size: int, headless: bool = True):
+        self.size = size
+        self.headless = headless
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._all = []
+
+    def _acquire(self) -> webdriver.Chrome:
+        with self._lock:
+            if self._idle.empty() and self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if not create:
+            return self._idle.get()
+        try:
+            driver = make_driver(self.headless)
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        driver.cookies_accepted = False
+        with self._lock:
+            self._all.append(driver)
+        return driver
+
+    def _discard(self, driver: webdriver.Chrome) -> None:
+        with self._lock:
+            self._created -= 1
+            if driver in self._all:
+                self._all.remove(driver)
+        try:
+            driver.quit()
+        except Exception as e:
+            LOGGER.error(e)
+
+    @contextmanager
+    def driver(self):
+        driver = self._acquire()
+        try:
+            yield driver
+        except Exception:
+            self._discard(driver)
+            raise
+        else:
+            self._idle.put(driver)
+
+    def close(self) -> None:
+        with self._lock:
+            drivers, self._all = self._all, []
+            self._created = 0
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception as e:
+                LOGGER.error(e)
 
-    close_cookie_popup(driver)
+    def __enter__(self) -> "DriverPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by all workers: on average rate requests per
+    second, with bursts of up to capacity requests.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def dismiss_popups(driver: webdriver.Chrome) -> None:
+    # the cookie banner is shown once per browser session
+    if not getattr(driver, "cookies_accepted", False):
+        close_cookie_popup(driver)
+        driver.cookies_accepted = True
     close_ad_popup(driver)
 
+
+def find_company_link(hrefs) -> str:
+    company_link = None
+    for href in hrefs:
+        if href and COMPANY_LINK_PATTERN.search(href):
+            company_link = href
+    return company_link
+
+
+def save_next_data(
+    next_data: dict, company_id: str, output_dir: str, raw_store: RawPageStore = None
+) -> None:
+    if raw_store is not None:
+        raw_store.put(company_id, next_data)
+        return
+
+    output_path = os.path.join(output_dir, f"{company_id}.json")
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(next_data, f, ensure_ascii=False, indent=2)
+
+
+class CompanyUrlCache:
+    """
+    Persistent sqlite cache of business id -> company page url resolutions, so
+    re-scrapes go straight to the company page instead of searching for it.
+    Ids the search did not find are cached as negative entries that expire after
+    negative_ttl_seconds. Positive entries do not expire but are invalidated when
+    the cached page can not be used.
+    """
+
+    def __init__(
+        self,
+        path: str = os.path.join("data", "company_url_cache.sqlite"),
+        negative_ttl_seconds: float = 7 * 24 * 60 * 60,
+    ):
+        self.path = path
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS company_urls (
+                    business_id TEXT PRIMARY KEY,
+                    url TEXT,
+                    resolved_at REAL NOT NULL
+                )
+                """
+            )
+
+    def lookup(self, company_id: str) -> tuple:
+        """
+        Returns:
+            tuple: (hit, url). A hit with url None is a valid negative entry.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT url, resolved_at FROM company_urls WHERE business_id = ?",
+                (company_id,),
+            ).fetchone()
+        if row is None:
+            return False, None
+        url, resolved_at = row
+        if url is None and time.time() - resolved_at >= self.negative_ttl_seconds:
+            return False, None
+        return True, url
+
+    def put(self, company_id: str, url: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO company_urls (business_id, url, resolved_at) "
+                "VALUES (?, ?, ?)",
+                (company_id, url, time.time()),
+            )
+
+    def invalidate(self, company_id: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM company_urls WHERE business_id = ?", (company_id,)
+            )
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> "CompanyUrlCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def take_token(rate_limit: TokenBucket = None) -> None:
+    if rate_limit:
+        rate_limit.acquire()
+
+
+def resolve_company_link(
+    driver: webdriver.Chrome,
+    company_id: str,
+    base_url: str = None,
+    rate_limit: TokenBucket = None,
+) -> str:
+    take_token(rate_limit)
+    driver.get(url=base_url or COMPANY_INFO_WEBSITE_URL)
+    dismiss_popups(driver)
+
     elem = driver.find_element("id", "search-input")
     elem.click()
+    elem.clear()
     elem.send_keys(company_id)
+    # submitting the search loads the results page
+    take_token(rate_limit)
     elem.send_keys(Keys.ENTER)
 
     links = driver.find_elements(By.TAG_NAME, "a")
-    company_link = None
-    for link in links:
-        href = link.get_attribute("href")
-        if href and re.search(r"/\d{7}$", href):
-            company_link = href
+    return find_company_link(link.get_attribute("href") for link in links)
 
-    if company_link:
-        driver.get(company_link)
 
-        close_cookie_popup(driver)
-        close_ad_popup(driver)
+def fetch_next_data_json(
+    company_id: str,
+    driver: webdriver.Chrome,
+    base_url: str = None,
+    url_cache: CompanyUrlCache = None,
+    rate_limit: TokenBucket = None,
+) -> str:
+    """
+    Opens the company page in the browser and returns the raw __NEXT_DATA__ JSON
+    text, or None if the search did not find the company. If rate_limit is set, a
+    token is taken before every page load.
+    """
+    cached, company_link = url_cache.lookup(company_id) if url_cache else (False, None)
+    if not cached:
+        company_link = resolve_company_link(driver, company_id, base_url, rate_limit)
+        if url_cache:
+            url_cache.put(company_id, company_link)
+
+    if not company_link:
+        LOGGER.warning(f"Company link not found for {company_id}")
+        return None
+
+    try:
+        take_token(rate_limit)
+        driver.get(company_link)
+        dismiss_popups(driver)
 
         script = driver.find_element(By.ID, "__NEXT_DATA__")
-        next_data_json = script.get_attribute("innerHTML")
+        return script.get_attribute("innerHTML")
+    except Exception:
+        if cached:
+            url_cache.invalidate(company_id)
+        raise
+
+
+def get_company_details(
+    company_id: str,
+    driver: webdriver.Chrome = None,
+    base_url: str = None,
+    output_dir: str = os.path.join("data", "scraped_raw_jsons"),
+    url_cache: CompanyUrlCache = None,
+    raw_store: RawPageStore = None,
+) -> bool:
+    """
+    Args:
+        company_id (str): Business id of the company.
+        driver (webdriver.Chrome, optional): Driver to reuse. If not set, a new one
+            is started and quit afterwards.
+        base_url (str, optional): Search page url, defaults to COMPANY_INFO_WEBSITE_URL.
+        output_dir (str): Directory the raw JSON is written to.
+        url_cache (CompanyUrlCache, optional): Cache of resolved company urls.
+        raw_store (RawPageStore, optional): If set, the page is added to this store
+            instead of being written to output_dir.
+
+    Returns:
+        bool: Whether the company page was found and saved.
+    """
+    owns_driver = driver is None
+    if owns_driver:
+        driver = webdriver.Chrome()
+
+    try:
+        next_data_json = fetch_next_data_json(company_id, driver, base_url, url_cache)
+        if next_data_json is None:
+            return False
+
+        save_next_data(json.loads(next_data_json), company_id, output_dir, raw_store)
+        return True
+    finally:
+        if owns_driver:
+            driver.close()
+            driver.quit()
+
+
+class HttpFetchError(Exception):
+    pass
+
+
+def make_http_session(pool_size: int = 4) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HTTP_HEADERS)
+    return session
+
+
+def extract_next_data(html: str) -> dict:
+    match = NEXT_DATA_PATTERN.search(html)
+    if not match:
+        raise HttpFetchError("__NEXT_DATA__ script tag not found")
+    return json.loads(match.group(1))
+
+
+def resolve_company_link_http(
+    session: requests.Session,
+    company_id: str,
+    base_url: str = None,
+    timeout: float = 20,
+    rate_limit: TokenBucket = None,
+) -> str:
+    search_url = urljoin(
+        base_url or COMPANY_INFO_WEBSITE_URL,
+        SEARCH_PATH_TEMPLATE.format(company_id=quote(company_id)),
+    )
+    take_token(rate_limit)
+    response = session.get(search_url, timeout=timeout)
+    response.raise_for_status()
+
+    hrefs = (
+        urljoin(response.url, unescape(h)) for h in HREF_PATTERN.findall(response.text)
+    )
+    return find_company_link(hrefs)
+
+
+def fetch_company_html(
+    company_id: str,
+    session: requests.Session,
+    base_url: str = None,
+    timeout: float = 20,
+    url_cache: CompanyUrlCache = None,
+    rate_limit: TokenBucket = None,
+) -> str:
+    """
+    Returns the raw html of the company page, or None if the company is cached as
+    not found. If rate_limit is set, a token is taken before every request.
+
+    Raises:
+        HttpFetchError: If the search results or the company page can not be used,
+            in which case the browser path should be tried instead.
+    """
+    cached, company_link = url_cache.lookup(company_id) if url_cache else (False, None)
+    if cached and not company_link:
+        LOGGER.warning(f"Company link not found for {company_id} (cached)")
+        return None
+
+    if not cached:
+        company_link = resolve_company_link_http(
+            session, company_id, base_url, timeout, rate_limit
+        )
+        if not company_link:
+            # the results may be rendered client side only, so this is not cached
+            # as a negative entry and the browser path gets to decide
+            raise HttpFetchError(
+                f"No company link in the search results of {company_id}"
+            )
+        if url_cache:
+            url_cache.put(company_id, company_link)
+
+    try:
+        take_token(rate_limit)
+        response = session.get(company_link, timeout=timeout)
+        response.raise_for_status()
+        if "__NEXT_DATA__" not in response.text:
+            raise HttpFetchError("__NEXT_DATA__ script tag not found")
+    except Exception:
+        if cached:
+            url_cache.invalidate(company_id)
+        raise
+    return response.text
 
-        next_data = json.loads(next_data_json)
-        output_path = os.path.join("data", "scraped_raw_jsons", f"{company_id}.json")
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(next_data, f, ensure_ascii=False, indent=2)
-    else:
-        LOGGER.warning(f"Company link not found for {company_id}")
 
-    driver.close()
-    driver.quit()
+def get_company_details_http(
+    company_id: str,
+    session: requests.Session,
+    base_url: str = None,
+    output_dir: str = os.path.join("data", "scraped_raw_jsons"),
+    timeout: float = 20,
+    url_cache: CompanyUrlCache = None,
+    raw_store: RawPageStore = None,
+) -> bool:
+    """
+    Lightweight alternative to get_company_details: resolves the company link from
+    the server rendered search results and reads __NEXT_DATA__ from the raw html of
+    the company page, without a browser.
+
+    Raises:
+        HttpFetchError: If the search results or the company page can not be used,
+            in which case the browser path should be tried instead.
+    """
+    html = fetch_company_html(company_id, session, base_url, timeout, url_cache)
+    if html is None:
+        return False
+
+    save_next_data(extract_next_data(html), company_id, output_dir, raw_store)
+    return True
+
+
+class ScrapeLedger:
+    """
+    Persistent sqlite job ledger of a scraping run. Records the state of every
+    business id (pending, done, not_found or failed) together with the number of
+    attempts, so an interrupted run resumes where it left off and failures are
+    retried with exponential backoff.
+    """
+
+    PENDING = "pending"
+    DONE = "done"
+    NOT_FOUND = "not_found"
+    FAILED = "failed"
+
+    def __init__(
+        self,
+        path: str = os.path.join("data", "scrape_ledger.sqlite"),
+        backoff_seconds: float = 60,
+        max_backoff_seconds: float = 6 * 60 * 60,
+    ):
+        self.path = path
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    business_id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL,
+                    next_attempt_at REAL,
+                    error TEXT
+                )
+                """
+            )
+
+    def add(self, company_ids: list) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO jobs (business_id, state) VALUES (?, ?)",
+                [(company_id, self.PENDING) for company_id in company_ids],
+            )
+
+    def get(self, company_id: str) -> dict:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT state, attempts, updated_at, next_attempt_at, error "
+                "FROM jobs WHERE business_id = ?",
+                (company_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("state", "attempts", "updated_at", "next_attempt_at", "error")
+        return dict(zip(keys, row))
+
+    def _set(self, company_id: str, state: str, error: str = None) -> None:
+        now = time.time()
+        with self._lock, self._connection:
+            if state == self.FAILED:
+                attempts = (
+                    self._connection.execute(
+                        "SELECT attempts FROM jobs WHERE business_id = ?",
+                        (company_id,),
+                    ).fetchone()
+                    or (0,)
+                )[0] + 1
+                backoff = min(
+                    self.backoff_seconds * 2 ** (attempts - 1),
+                    self.max_backoff_seconds,
+                )
+                next_attempt_at = now + backoff
+            else:
+                attempts, next_attempt_at = 0, None
+            self._connection.execute(
+                """
+                INSERT INTO jobs (business_id, state, attempts, updated_at, next_attempt_at, error)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (business_id) DO UPDATE SET
+                    state = excluded.state,
+                    attempts = excluded.attempts,
+                    updated_at = excluded.updated_at,
+                    next_attempt_at = excluded.next_attempt_at,
+                    error = excluded.error
+                """,
+                (company_id, state, attempts, now, next_attempt_at, error),
+            )
+
+    def mark_done(self, company_id: str) -> None:
+        self._set(company_id, self.DONE)
+
+    def mark_not_found(self, company_id: str) -> None:
+        self._set(company_id, self.NOT_FOUND)
+
+    def mark_failed(self, company_id: str, error: str) -> None:
+        self._set(company_id, self.FAILED, error)
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+            ).fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> "ScrapeLedger":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def is_fresh(path: str, max_age_seconds: float) -> bool:
+    return (
+        os.path.exists(path) and time.time() - os.path.getmtime(path) < max_age_seconds
+    )
+
+
+def select_due_companies(
+    company_ids: list,
+    ledger: ScrapeLedger,
+    output_dir: str,
+    max_age_days: float = 30,
+    max_attempts: int = 5,
+    retry_failed_only: bool = False,
+    raw_store: RawPageStore = None,
+) -> list:
+    """
+    Returns the ids that still need a visit. Ids with a fresh JSON are marked
+    done and skipped, not-found ids are only retried once max_age_days passed,
+    and failed ids once their backoff expired, up to max_attempts times.
+    """
+    max_age_seconds = max_age_days * 24 * 60 * 60
+    now = time.time()
+    ledger.add(company_ids)
+
+    due = []
+    for company_id in company_ids:
+        job = ledger.get(company_id)
+        if retry_failed_only and job["state"] != ScrapeLedger.FAILED:
+            continue
+
+        if raw_store is not None:
+            scraped_at = raw_store.latest_scraped_at(company_id)
+            fresh = scraped_at is not None and now - scraped_at < max_age_seconds
+        else:
+            output_path = os.path.join(output_dir, f"{company_id}.json")
+            fresh = is_fresh(output_path, max_age_seconds)
+        if fresh:
+            if job["state"] != ScrapeLedger.DONE:
+                ledger.mark_done(company_id)
+            continue
+
+        if job["state"] == ScrapeLedger.NOT_FOUND:
+            if now - job["updated_at"] < max_age_seconds:
+                continue
+        elif job["state"] == ScrapeLedger.FAILED:
+            if job["attempts"] >= max_attempts or now < job["next_attempt_at"]:
+                continue
+        due.append(company_id)
+    return due
+
+
+class PipelineStage:
+    """
+    Bounded input queue of a scraping pipeline stage plus its throughput counter.
+    A full queue blocks the upstream stage, which keeps the number of pages held
+    in memory constant however long the company list is.
+    """
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.processed = 0
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def done(self) -> None:
+        with self._lock:
+            self.processed += 1
+
+    def stats(self) -> dict:
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            "queue_depth": self.queue.qsize(),
+            "processed": self.processed,
+            "per_second": round(self.processed / elapsed, 2),
+        }
+
+
+_STOP = object()
+
+
+def run_stage(stage: PipelineStage, func, num_workers: int) -> list:
+    """
+    Starts num_workers threads calling func for every item of the stage queue
+    until they receive the stop sentinel.
+    """
+
+    def work():
+        while True:
+            item = stage.queue.get()
+            if item is _STOP:
+                return
+            try:
+                func(item)
+            except Exception:
+                # a dead worker would leave its share of the queue undrained and
+                # block the upstream stage forever
+                LOGGER.exception(f"Unhandled error in the {stage.name} stage")
+            stage.done()
+
+    threads = [
+        threading.Thread(target=work, name=f"{stage.name}-{i}", daemon=True)
+        for i in range(num_workers)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def stop_stage(stage: PipelineStage, threads: list) -> None:
+    for _ in threads:
+        stage.queue.put(_STOP)
+    for thread in threads:
+        thread.join()
+
+
+def scrape_companies(
+    company_ids,
+    workers: int = 4,
+    rate: float = 0.5,
+    burst: int = 1,
+    headless: bool = True,
+    base_url: str = None,
+    output_dir: str = os.path.join("data", "scraped_raw_jsons"),
+    ledger: ScrapeLedger = None,
+    backend: str = "http",
+    url_cache: CompanyUrlCache = None,
+    raw_store: RawPageStore = None,
+    extract_workers: int = 1,
+    persist_workers: int = 1,
+    queue_size: int = None,
+    report_interval: float = 30,
+) -> dict:
+    """
+    Scrapes companies in a fetch -> extract -> persist pipeline connected by
+    bounded queues. N fetch workers download pages concurrently, while parsing the
+    __NEXT_DATA__ payload and the (compressed) writes run on their own workers.
+    Queue depth and throughput of every stage are logged every report_interval
+    seconds.
+
+    With the "http" backend pages are fetched with pooled keep-alive http sessions,
+    and the pool of reused browser drivers is only used for companies the plain
+    fetch fails for. The "browser" backend always uses the drivers.
+    Page requests of all fetch workers together (search and company page, and
+    the browser retry) are limited to rate per second.
+    If a ledger is given, the outcome of every company is checkpointed into it
+    as soon as it is known. A url_cache skips the search step for companies whose
+    page was resolved before. With a raw_store, pages are added to the store
+    instead of being written as JSON files into output_dir.
+
+    Returns:
+        dict: {company_id: True (saved) / False (not found) / None (failed)}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    queue_size = queue_size or 2 * workers
+    bucket = TokenBucket(rate=rate, capacity=burst)
+    results = {}
+    results_lock = threading.Lock()
+
+    fetch_stage = PipelineStage("fetch", queue_size)
+    extract_stage = PipelineStage("extract", queue_size)
+    persist_stage = PipelineStage("persist", queue_size)
+    stages = (fetch_stage, extract_stage, persist_stage)
+
+    def record(company_id: str, outcome, error: Exception = None) -> None:
+        with results_lock:
+            results[company_id] = outcome
+        if outcome is None:
+            LOGGER.error(f"Scraping {company_id} failed: {error}")
+        if not ledger:
+            return
+        if outcome is None:
+            ledger.mark_failed(company_id, str(error))
+        elif outcome:
+            ledger.mark_done(company_id)
+        else:
+            ledger.mark_not_found(company_id)
+
+    sessions = threading.local()
+
+    with DriverPool(size=workers, headless=headless) as pool:
+
+        def fetch(company_id: str) -> None:
+            try:
+                if backend == "http":
+                    if not hasattr(sessions, "session"):
+                        sessions.session = make_http_session()
+                    try:
+                        html = fetch_company_html(
+                            company_id,
+                            session=sessions.session,
+                            base_url=base_url,
+                            url_cache=url_cache,
+                            rate_limit=bucket,
+                        )
+                        if html is None:
+                            record(company_id, False)
+                        else:
+                            extract_stage.queue.put((company_id, "html", html))
+                        return
+                    except (requests.RequestException, HttpFetchError) as e:
+                        LOGGER.info(
+                            f"Falling back to the browser for {company_id}: {e}"
+                        )
+
+                with pool.driver() as driver:
+                    next_data_json = fetch_next_data_json(
+                        company_id,
+                        driver,
+                        base_url=base_url,
+                        url_cache=url_cache,
+                        rate_limit=bucket,
+                    )
+                if next_data_json is None:
+                    record(company_id, False)
+                else:
+                    extract_stage.queue.put((company_id, "json", next_data_json))
+            except Exception as e:
+                record(company_id, None, e)
+
+        def extract(item: tuple) -> None:
+            company_id, kind, text = item
+            try:
+                if kind == "html":
+                    next_data = extract_next_data(text)
+                else:
+                    next_data = json.loads(text)
+                persist_stage.queue.put((company_id, next_data))
+            except Exception as e:
+                record(company_id, None, e)
+
+        def persist(item: tuple) -> None:
+            company_id, next_data = item
+            try:
+                save_next_data(next_data, company_id, output_dir, raw_store)
+                record(company_id, True)
+            except Exception as e:
+                record(company_id, None, e)
+
+        finished = threading.Event()
+
+        def report() -> None:
+            while not finished.wait(report_interval):
+                LOGGER.info(
+                    "Pipeline "
+                    + ", ".join(f"{stage.name}: {stage.stats()}" for stage in stages)
+                )
+
+        reporter = threading.Thread(target=report, name="report", daemon=True)
+        reporter.start()
+
+        fetch_threads = run_stage(fetch_stage, fetch, workers)
+        extract_threads = run_stage(extract_stage, extract, extract_workers)
+        persist_threads = run_stage(persist_stage, persist, persist_workers)
+
+        for company_id in company_ids:
+            fetch_stage.queue.put(company_id)
+
+        stop_stage(fetch_stage, fetch_threads)
+        stop_stage(extract_stage, extract_threads)
+        stop_stage(persist_stage, persist_threads)
+        finished.set()
+        reporter.join()
+
+    LOGGER.info(
+        "Pipeline finished, "
+        + ", ".join(f"{stage.name}: {stage.stats()}" for stage in stages)
+    )
+    return results
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Scrape company pages")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent browsers")
+    parser.add_argument(
+        "--rate", type=float, default=0.5, help="Page requests per second, all workers"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["http", "browser"],
+        default="http",
+        help="Fetch pages over plain http with browser fallback, or always with Chrome",
+    )
+    parser.add_argument(
+        "--show-browser", action="store_true", help="Do not run Chrome headless"
+    )
+    parser.add_argument(
+        "--ledger",
+        default=os.path.join("data", "scrape_ledger.sqlite"),
+        help="Job ledger used to resume interrupted runs",
+    )
+    parser.add_argument(
+        "--url-cache",
+        default=os.path.join("data", "company_url_cache.sqlite"),
+        help="Cache of business id to company page url resolutions",
+    )
+    parser.add_argument(
+        "--output",
+        choices=["store", "json"],
+        default="store",
+        help="Add pages to the compressed raw page store or write JSON files",
+    )
+    parser.add_argument(
+        "--max-age-days",
+        type=float,
+        default=30,
+        help="Scraped JSONs younger than this are not scraped again",
+    )
+    parser.add_argument(
+        "--max-attempts", type=int, default=5, help="Attempts per failing company"
+    )
+    parser.add_argument(
+        "--retry-failed", action="store_true", help="Only retry failed companies"
+    )
+    args = parser.parse_args()
+
     if not COMPANY_INFO_WEBSITE_URL:
         raise ValueError("COMPANY_INFO_URL environment variable is not set.")
 
@@ -94,11 +933,39 @@ def main():
         company_list_df["business_id"].notna()
     ].reset_index(drop=True)
 
-    for index, row in company_list_df.iterrows():
-        company_id = row["business_id"]
-        get_company_details(company_id=company_id)
-        time.sleep(randint(1, 3))
+    output_dir = os.path.join("data", "scraped_raw_jsons")
+    with ExitStack() as stack:
+        ledger = stack.enter_context(ScrapeLedger(args.ledger))
+        url_cache = stack.enter_context(CompanyUrlCache(args.url_cache))
+        raw_store = (
+            stack.enter_context(RawPageStore()) if args.output == "store" else None
+        )
+
+        company_ids = select_due_companies(
+            company_list_df["business_id"].tolist(),
+            ledger,
+            output_dir,
+            max_age_days=args.max_age_days,
+            max_attempts=args.max_attempts,
+            retry_failed_only=args.retry_failed,
+            raw_store=raw_store,
+        )
+        LOGGER.info(f"{len(company_ids)} companies to scrape, {ledger.counts()}")
+
+        scrape_companies(
+            company_ids,
+            workers=args.workers,
+            rate=args.rate,
+            headless=not args.show_browser,
+            output_dir=output_dir,
+            ledger=ledger,
+            backend=args.backend,
+            url_cache=url_cache,
+            raw_store=raw_store,
+        )
+        LOGGER.info(f"Finished, {ledger.counts()}")
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     main()
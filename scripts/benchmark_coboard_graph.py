@@ -0,0 +1,115 @@
+"""
+Benchmarks the sparse co-board graph builder of director_network.py against the
+merge + iterrows builder the decision makers notebook used, on a synthetic
+decision makers table.
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import networkx as nx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import director_network  # noqa: E402
+
+
+def build_graph_iterrows(df: pd.DataFrame) -> nx.Graph:
+    df = df[["business_id", "decision_person_id", "first_name", "last_name"]].dropna(
+        subset=["decision_person_id", "business_id"]
+    )
+    df["label"] = df["first_name"].fillna("") + " " + df["last_name"].fillna("")
+    edges = (
+        df[["business_id", "decision_person_id"]]
+        .drop_duplicates()
+        .merge(df[["business_id", "decision_person_id"]], on="business_id")
+    )
+    edges = edges[edges["decision_person_id_x"] < edges["decision_person_id_y"]]
+    edges = (
+        edges.groupby(["decision_person_id_x", "decision_person_id_y"])
+        .size()
+        .reset_index(name="weight")
+    )
+    G = nx.Graph()
+    for _, row in edges.iterrows():
+        G.add_edge(
+            row["decision_person_id_x"],
+            row["decision_person_id_y"],
+            weight=row["weight"],
+        )
+    label_map = df.drop_duplicates("decision_person_id").set_index(
+        "decision_person_id"
+    )["label"]
+    for node in G.nodes():
+        G.nodes[node]["label"] = label_map.get(node, str(node))
+    return G
+
+
+def make_decision_makers(
+    num_companies: int, people_per_company: int, seed: int = 42
+) -> pd.DataFrame:
+    """
+    Boards drawn from a pool of people with a heavy tail, so that some people sit
+    on many boards like in all_decision_makers. Every person is listed once per
+    company: build_graph_iterrows counts a person listed twice in a company as two
+    shared companies, director_network counts it once.
+    """
+    rng = np.random.default_rng(seed)
+    num_people = num_companies * people_per_company // 2
+    business_ids = np.repeat(np.arange(num_companies), people_per_company)
+    person_ids = np.where(
+        rng.random(len(business_ids)) < 0.2,
+        (rng.zipf(1.5, len(business_ids)) - 1) % num_people,
+        rng.integers(0, num_people, len(business_ids)),
+    )
+    return pd.DataFrame(
+        {
+            "business_id": 10**7 + business_ids,
+            "decision_person_id": 10**9 + person_ids,
+            "first_name": "Matti",
+            "last_name": pd.Series(person_ids).astype(str).to_numpy(),
+        }
+    ).drop_duplicates(["business_id", "decision_person_id"])
+
+
+def same_graph(G: nx.Graph, H: nx.Graph) -> bool:
+    return dict(G.nodes(data="label")) == dict(H.nodes(data="label")) and {
+        frozenset((u, v)): w for u, v, w in G.edges(data="weight")
+    } == {frozenset((u, v)): w for u, v, w in H.edges(data="weight")}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--companies", type=int, default=20000)
+    parser.add_argument("--people-per-company", type=int, default=6)
+    args = parser.parse_args()
+
+    df = make_decision_makers(args.companies, args.people_per_company)
+    print(
+        f"{len(df)} rows, {df['business_id'].nunique()} companies, "
+        f"{df['decision_person_id'].nunique()} people"
+    )
+
+    graphs = {}
+    for name, builder in [
+        ("merge + iterrows", build_graph_iterrows),
+        ("sparse B @ B.T", director_network.build_coboard_graph),
+    ]:
+        start = time.perf_counter()
+        graphs[name] = builder(df)
+        elapsed = time.perf_counter() - start
+        G = graphs[name]
+        print(
+            f"{name:>18}: {elapsed:6.2f} s, "
+            f"{G.number_of_nodes()} nodes, {G.number_of_edges()} edges"
+        )
+
+    print(f"Identical graphs: {same_graph(*graphs.values())}")
+
+
+if __name__ == "__main__":
+    main()
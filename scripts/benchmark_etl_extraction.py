@@ -0,0 +1,118 @@
+"""
+Benchmarks the targeted __NEXT_DATA__ extraction of etl.py against the full json.load
+path on a synthetic directory of large company pages.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+from random import Random
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import etl  # noqa: E402
+
+
+def make_company_page(index: int, payload_items: int, rng: Random) -> dict:
+    years = [f"{2015 + year}1231" for year in range(8)]
+    data = {
+        "businessId": f"{3000000 + index}{index % 10}",
+        "name": f"Synthetic Company {index} Oy",
+        "cityName": rng.choice(["Helsinki", "Espoo", "Tampere", "Oulu"]),
+        "coordinates": {"lat": 60 + rng.random(), "lon": 24 + rng.random()},
+        "financialFiscalYears": years,
+        "financialTurnovers": [str(rng.randint(0, 100000)) for _ in years],
+        "decisionPersons": [
+            {"decisionPersonId": rng.randint(1, 10**9), "firstName": "Matti"}
+            for _ in range(5)
+        ],
+    }
+    # Everything else on the page: translations, layout and ad config, related
+    # companies etc. The ETL never reads it.
+    noise = [
+        {
+            "id": item,
+            "title": f'Related company {item} "Oy" {{}}[]',
+            "tags": [rng.random() for _ in range(10)],
+        }
+        for item in range(payload_items)
+    ]
+    return {
+        "props": {
+            "pageProps": {
+                "translations": {"noise": noise},
+                "dehydratedState": {
+                    "queries": [
+                        {"state": {"data": data}},
+                        {"state": {"data": {"related": noise}}},
+                    ]
+                },
+            }
+        },
+        "page": "/company/[slug]",
+        "buildId": "synthetic",
+    }
+
+
+def write_pages(directory: str, num_pages: int, payload_items: int) -> list:
+    rng = Random(42)
+    paths = []
+    for index in range(num_pages):
+        path = os.path.join(directory, f"{3000000 + index}-{index % 10}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                make_company_page(index, payload_items, rng),
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        paths.append(path)
+    return paths
+
+
+def measure(loader, paths: list) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    for path in paths:
+        loader(path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument(
+        "--payload-items",
+        type=int,
+        default=5000,
+        help="Irrelevant list items per page, controls the page size",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_pages(directory, args.pages, args.payload_items)
+        size_mb = sum(os.path.getsize(p) for p in paths) / 1e6
+        print(f"{args.pages} pages, {size_mb:.1f} MB on disk")
+
+        for name, loader in [
+            ("full json.load", etl.load_company_data_full),
+            ("targeted subtree", etl.load_company_data),
+        ]:
+            elapsed, peak = measure(loader, paths)
+            print(
+                f"{name:>18}: {elapsed:6.2f} s, "
+                f"{args.pages / elapsed:8.1f} pages/s, "
+                f"peak python heap {peak / 1e6:7.2f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
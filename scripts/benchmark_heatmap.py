@@ -0,0 +1,94 @@
+"""
+Benchmarks the vectorized labels and transforms of heatmaps.plot_heatmap against
+the per cell format_value loop and the separate transform branches it used, on
+synthetic tag x month funding pivots of increasing size.
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.stats import boxcox
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import heatmaps  # noqa: E402
+
+
+def text_and_z_loop(z_raw: np.ndarray, transform: str) -> tuple:
+    text = [[heatmaps.format_value(val) for val in row] for row in z_raw]
+    if transform == "log":
+        z = np.log1p(z_raw)
+    elif transform == "boxcox":
+        flat_values = z_raw[z_raw > 0].flatten()
+        if flat_values.size > 0:
+            transformed, _ = boxcox(flat_values)
+            z = np.zeros_like(z_raw, dtype=float)
+            z[z_raw > 0] = transformed
+        else:
+            z = z_raw
+    else:
+        z = z_raw
+    return text, z
+
+
+def text_and_z_vectorized(z_raw: np.ndarray, transform: str) -> tuple:
+    return heatmaps.format_values(z_raw), heatmaps.transform_values(z_raw, transform)
+
+
+def make_pivot(num_tags: int, num_months: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Log-normal funding amounts from thousands to billions, with most tag-months
+    empty like in the Dealroom exports.
+    """
+    rng = np.random.default_rng(seed)
+    amounts = np.round(rng.lognormal(15, 2.5, (num_tags, num_months)))
+    amounts[rng.random(amounts.shape) < 0.6] = 0
+    return pd.DataFrame(
+        amounts,
+        index=[f"tag {i}" for i in range(num_tags)],
+        columns=pd.period_range("2000-01", periods=num_months, freq="M").astype(str),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        default=["26x26", "500x120", "2000x300", "5000x300"],
+        help="Pivot sizes as tags x months",
+    )
+    parser.add_argument("--transform", default="boxcox", choices=heatmaps.TRANSFORMS)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        num_tags, num_months = map(int, size.split("x"))
+        z_raw = make_pivot(num_tags, num_months).values
+        results = {}
+        timings = []
+        for name, builder in [
+            ("loop", text_and_z_loop),
+            ("vectorized", text_and_z_vectorized),
+            # re-render of the same pivot, the Box-Cox lambda is cached
+            ("cached", text_and_z_vectorized),
+        ]:
+            start = time.perf_counter()
+            results[name] = builder(z_raw, args.transform)
+            timings.append(f"{name} {time.perf_counter() - start:6.3f} s")
+
+        (loop_text, loop_z), (text, z), _ = results.values()
+        identical = loop_text == text.tolist() and np.allclose(
+            loop_z, z, rtol=0, atol=1e-12, equal_nan=True
+        )
+        print(
+            f"{size:>10} ({z_raw.size} cells): {', '.join(timings)}, "
+            f"identical: {identical}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,20 @@
 import os
+import json
+import time
+import shutil
+import hashlib
 import subprocess
 import argparse
 from typing import List
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# root modules the notebooks import, published next to the exported notebooks
+SHARED_MODULES = ("data_loader.py", "director_network.py")
+
+# hashes of the inputs of the last build, kept outside the output directory so
+# it is not published with the site
+BUILD_MANIFEST = ".build_manifest.json"
 
 
 def export_html_wasm(notebook_path: str, output_dir: str, as_app: bool = False) -> bool:
@@ -32,6 +44,100 @@ def export_html_wasm(notebook_path: str, output_dir: str, as_app: bool = False)
         return False
 
 
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def marimo_version() -> str:
+    try:
+        result = subprocess.run(
+            ["marimo", "--version"], capture_output=True, text=True, check=True
+        )
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def load_build_manifest(manifest_path: str) -> dict:
+    if not os.path.exists(manifest_path):
+        return {"notebooks": {}, "data": {}}
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def save_build_manifest(manifest: dict, manifest_path: str) -> None:
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def notebook_hash(notebook_path: str, version: str, as_app: bool) -> str:
+    """
+    sha256 of the notebook source, the marimo version and the export mode, the
+    inputs of its exported html.
+    """
+    digest = hashlib.sha256(file_sha256(notebook_path).encode())
+    digest.update(f"{version} {as_app}".encode())
+    return digest.hexdigest()
+
+
+def copy_changed_files(src: Path, dst: Path, hashes: dict) -> dict:
+    """
+    Copies the files of src whose content differs from the hashes of the last
+    build, or that are missing in dst, and removes the files of the last build
+    that are no longer in src.
+
+    Returns:
+        dict: {path relative to src: sha256} of the copied directory.
+    """
+    current = {}
+    copied = 0
+    for path in sorted(p for p in src.rglob("*") if p.is_file()):
+        relative = path.relative_to(src).as_posix()
+        current[relative] = file_sha256(path)
+        target = dst / relative
+        if hashes.get(relative) != current[relative] or not target.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(path, target)
+            copied += 1
+
+    removed = [relative for relative in hashes if relative not in current]
+    for relative in removed:
+        (dst / relative).unlink(missing_ok=True)
+    print(f"Copied {copied} of {len(current)} files to {dst}, {len(removed)} removed")
+    return current
+
+
+def timed_export(notebook_path: str, output_dir: str, as_app: bool) -> tuple:
+    start = time.perf_counter()
+    succeeded = export_html_wasm(notebook_path, output_dir, as_app=as_app)
+    return notebook_path, succeeded, time.perf_counter() - start
+
+
+def export_notebooks(
+    notebooks: List[str], output_dir: str, workers: int, as_app: bool = True
+) -> List[str]:
+    """
+    Exports the notebooks concurrently, at most workers marimo processes at a
+    time, and returns the notebooks that failed to export.
+    """
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        results = list(
+            executor.map(lambda nb: timed_export(nb, output_dir, as_app), notebooks)
+        )
+
+    failed = []
+    for notebook_path, succeeded, seconds in results:
+        status = "exported" if succeeded else "FAILED"
+        print(f"{notebook_path}: {status} in {seconds:.1f} s")
+        if not succeeded:
+            failed.append(notebook_path)
+    return failed
+
+
 def generate_index(all_notebooks: List[str], output_dir: str) -> None:
     print("Generating index.html")
 
@@ -91,6 +197,23 @@ def main() -> None:
     parser.add_argument(
         "--output-dir", default="_site", help="Output directory for built files"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of notebooks exported concurrently",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-export every notebook and copy all data, ignoring the manifest "
+        "of the last build",
+    )
+    parser.add_argument(
+        "--manifest",
+        default=BUILD_MANIFEST,
+        help="Manifest of the last build, must be outside the output directory",
+    )
     args = parser.parse_args()
 
     root = Path(".")
@@ -104,8 +227,30 @@ def main() -> None:
         print("No Marimo notebooks found!")
         return
 
-    for nb in all_notebooks:
-        export_html_wasm(nb, args.output_dir, as_app=True)
+    manifest = {"notebooks": {}, "data": {}}
+    if not args.force:
+        manifest = load_build_manifest(args.manifest)
+
+    version = marimo_version()
+    hashes = {nb: notebook_hash(nb, version, as_app=True) for nb in all_notebooks}
+    changed = [
+        nb
+        for nb in all_notebooks
+        if manifest["notebooks"].get(nb) != hashes[nb]
+        or not os.path.exists(os.path.join(args.output_dir, nb.replace(".py", ".html")))
+    ]
+    for nb in sorted(set(all_notebooks) - set(changed)):
+        print(f"Unchanged, reusing {nb.replace('.py', '.html')}")
+
+    start = time.perf_counter()
+    failed = export_notebooks(changed, args.output_dir, args.workers)
+    print(
+        f"Exported {len(changed) - len(failed)} of {len(changed)} changed "
+        f"notebooks in {time.perf_counter() - start:.1f} s"
+    )
+    manifest["notebooks"] = {
+        nb: hashes[nb] if nb not in failed else None for nb in all_notebooks
+    }
 
     generate_index(all_notebooks, args.output_dir)
 
@@ -113,10 +258,16 @@ def main() -> None:
     data_dst = Path(args.output_dir) / "data" / "company_info"
 
     if data_src.exists():
-        print(f"Copying data/ to {data_dst}")
-        import shutil
+        manifest["data"] = copy_changed_files(data_src, data_dst, manifest["data"])
+
+    save_build_manifest(manifest, args.manifest)
+
+    # shared modules, fetched by the notebooks at runtime in the WASM export
+    for module in SHARED_MODULES:
+        shutil.copy2(module, Path(args.output_dir) / module)
 
-        shutil.copytree(data_src, data_dst, dirs_exist_ok=True)
+    if failed:
+        raise SystemExit(f"Failed to export: {', '.join(failed)}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,206 @@
+"""
+Local stand-in for the company information website, used to exercise scraper.py
+without hitting the real site.
+
+It serves a search page with a `search-input` field whose results link to company
+pages ending in the 7 digit business id, the same results server rendered under
+/search?what=<business id>, and company pages that embed a synthetic
+`__NEXT_DATA__` payload.
+
+    python scripts/stub_company_site.py --port 8765
+    COMPANY_INFO_WEBSITE_URL=http://127.0.0.1:8765/ python scraper.py
+"""
+
+import re
+import json
+import argparse
+import threading
+from random import Random
+from urllib.parse import parse_qs, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SEARCH_PAGE = """<!DOCTYPE html>
+<html>
+  <head><title>Company search</title></head>
+  <body>
+    <button id="onetrust-accept-btn-handler"
+            onclick="this.remove()">Accept cookies</button>
+    <input id="search-input" type="text" />
+    <div id="results"></div>
+    <script>
+      const known = new Set(%(known_ids)s);
+      document.getElementById("search-input").addEventListener("keydown", (e) => {
+        if (e.key !== "Enter") return;
+        const businessId = e.target.value.trim();
+        const digits = businessId.replace("-", "").slice(0, 7);
+        const results = document.getElementById("results");
+        results.innerHTML = "";
+        if (known.size === 0 || known.has(businessId)) {
+          const link = document.createElement("a");
+          link.href = "/yritys/company/" + digits;
+          link.textContent = businessId;
+          results.appendChild(link);
+        }
+      });
+    </script>
+  </body>
+</html>
+"""
+
+SEARCH_RESULTS_PAGE = """<!DOCTYPE html>
+<html>
+  <head><title>Search results</title></head>
+  <body>
+    <a href="/">Front page</a>
+    %(results)s
+  </body>
+</html>
+"""
+
+COMPANY_PAGE = """<!DOCTYPE html>
+<html>
+  <head><title>%(name)s</title></head>
+  <body>
+    <h1>%(name)s</h1>
+    <script id="__NEXT_DATA__" type="application/json">%(next_data)s</script>
+  </body>
+</html>
+"""
+
+COMPANY_PATH = re.compile(r"^/yritys/[^/]+/(\d{7})$")
+
+
+def make_next_data(
+    digits: str, payload_items: int = 0, check_digit: str = None
+) -> dict:
+    rng = Random(digits)
+    years = [f"{2019 + year}1231" for year in range(5)]
+    if check_digit is None:
+        check_digit = str(rng.randint(0, 9))
+    data = {
+        "businessId": f"{digits}{check_digit}",
+        "name": f"Stub Company {digits} Oy",
+        "cityName": rng.choice(["Helsinki", "Espoo", "Tampere"]),
+        "provinceName": "Uudenmaan maakunta",
+        "address": {"streetAddress": "Testikatu 1", "postalCode": "00100"},
+        "coordinates": {"lat": 60 + rng.random(), "lon": 24 + rng.random()},
+        "financialFiscalYears": years,
+        "financialTurnovers": [str(rng.randint(0, 10000)) for _ in years],
+        "financialOperatingProfits": [str(rng.randint(-500, 500)) for _ in years],
+        "decisionPersons": [
+            {
+                "decisionPersonId": rng.randint(10**8, 10**9),
+                "firstName": "Matti",
+                "lastName": f"Meikäläinen {person}",
+                "positionText": "toimitusjohtaja",
+            }
+            for person in range(3)
+        ],
+    }
+    return {
+        "props": {
+            "pageProps": {
+                "noise": [rng.random() for _ in range(payload_items)],
+                "dehydratedState": {"queries": [{"state": {"data": data}}]},
+            }
+        },
+        "page": "/yritys/[slug]/[id]",
+    }
+
+
+def make_handler(known_ids: list, payload_items: int):
+    class StubCompanySiteHandler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: str) -> None:
+            encoded = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(encoded)))
+            self.end_headers()
+            self.wfile.write(encoded)
+
+        def do_GET(self) -> None:
+            url = urlsplit(self.path)
+            path = url.path
+            if path in ("", "/"):
+                self._send(200, SEARCH_PAGE % {"known_ids": json.dumps(known_ids)})
+                return
+
+            if path == "/search":
+                business_id = parse_qs(url.query).get("what", [""])[0].strip()
+                digits = business_id.replace("-", "")[:7]
+                results = ""
+                if digits and (not known_ids or business_id in known_ids):
+                    results = f'<a href="/yritys/company/{digits}">{business_id}</a>'
+                self._send(200, SEARCH_RESULTS_PAGE % {"results": results})
+                return
+
+            match = COMPANY_PATH.match(path)
+            if not match:
+                self._send(404, "<html><body>Not found</body></html>")
+                return
+
+            digits = match.group(1)
+            known = [i for i in known_ids if i.replace("-", "")[:7] == digits]
+            if known_ids and not known:
+                self._send(404, "<html><body>Not found</body></html>")
+                return
+
+            check_digit = known[0][-1] if known else None
+            next_data = make_next_data(digits, payload_items, check_digit)
+            self._send(
+                200,
+                COMPANY_PAGE
+                % {
+                    "name": next_data["props"]["pageProps"]["dehydratedState"][
+                        "queries"
+                    ][0]["state"]["data"]["name"],
+                    "next_data": json.dumps(next_data, ensure_ascii=False),
+                },
+            )
+
+        def log_message(self, format, *args) -> None:
+            pass
+
+    return StubCompanySiteHandler
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    known_ids: list = None,
+    payload_items: int = 0,
+) -> ThreadingHTTPServer:
+    """
+    Starts the stub site in a background thread and returns the server.
+    Its url is http://{host}:{server.server_port}/, stop it with server.shutdown().
+
+    Args:
+        known_ids (list, optional): Business ids the search finds. All ids if empty.
+        payload_items (int): Size of the irrelevant payload on company pages.
+    """
+    server = ThreadingHTTPServer(
+        (host, port), make_handler(known_ids or [], payload_items)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a stub company website")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--payload-items", type=int, default=0)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(
+        (args.host, args.port), make_handler([], args.payload_items)
+    )
+    print(f"Serving stub company site on http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()